@@ -1,15 +1,35 @@
+import atexit
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import math
+import mimetypes
 import os
+import queue
+import re
 import secrets
-import uuid
+import select
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from functools import wraps
+from functools import lru_cache, wraps
 
+import brotli
+import click
 import jwt as pyjwt
+import numpy as np
 import psycopg2
 import psycopg2.extras
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request, send_from_directory
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import Flask, Request, abort, jsonify, render_template, request, send_file
+from PIL import ExifTags, Image, ImageOps, features
+from werkzeug.security import check_password_hash, generate_password_hash, safe_join
 from werkzeug.utils import secure_filename
 
 load_dotenv()
@@ -27,7 +47,80 @@ TOKEN_EXPIRY_DAYS = 30
 ALLOWED_CARD_COLORS = {"#f5e6c8", "#f5d0c8", "#d5e8d0", "#2a1e14"}
 
 
-def get_db():
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 1800))
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", 30))
+POSITION_FLUSH_INTERVAL = float(os.getenv("POSITION_FLUSH_INTERVAL", 0.5))
+SNAPSHOT_CACHE_BYTES = int(os.getenv("SNAPSHOT_CACHE_BYTES", 64 * 1024 * 1024))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+OWNERSHIP_CACHE_SIZE = int(os.getenv("OWNERSHIP_CACHE_SIZE", 100000))
+# Any werkzeug method string; stored hashes with other parameters are
+# upgraded on the next successful login.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 16))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+SSE_MAX_DURATION = float(os.getenv("SSE_MAX_DURATION", 60))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+# Room for the card's text fields next to the image.
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES + 1024 * 1024
+STATIC_OFFLOAD = os.getenv("STATIC_OFFLOAD", "")  # "", "x-sendfile" or "x-accel"
+X_ACCEL_PREFIX = os.getenv("X_ACCEL_PREFIX", "/_files")
+app.config["USE_X_SENDFILE"] = STATIC_OFFLOAD == "x-sendfile"
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+COMPRESSIBLE_TYPES = {
+    "text/css", "text/html", "text/javascript", "application/javascript", "application/json", "image/svg+xml",
+}
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+CSS_ASSET_URL = re.compile(r"""url\((['"]?)/assets/([^'")?#]+)\1\)""")
+IMAGE_SIGNATURES = {b"\xff\xd8\xff": "jpg", b"\x89PNG\r\n\x1a\n": "png"}
+UPLOAD_GC_GRACE = float(os.getenv("UPLOAD_GC_GRACE", 3600))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 80))
+IMAGE_VARIANT_SIZES = {
+    "thumb": int(os.getenv("IMAGE_THUMB_SIZE", 420)),
+    "display": int(os.getenv("IMAGE_DISPLAY_SIZE", 1600)),
+}
+IMAGE_VARIANT_FORMATS = [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+LAYOUT_WORKERS = int(os.getenv("LAYOUT_WORKERS", 1))
+LAYOUT_MAX_PENDING = int(os.getenv("LAYOUT_MAX_PENDING", 2))
+LAYOUT_TIME_BUDGET = float(os.getenv("LAYOUT_TIME_BUDGET", 2))
+LAYOUT_ITERATIONS = int(os.getenv("LAYOUT_ITERATIONS", 300))
+LAYOUT_SPACING = float(os.getenv("LAYOUT_SPACING", 320))  # ideal distance between connected cards
+LAYOUT_MAX_GRID = 128
+GRAPH_CACHE_BOARDS = int(os.getenv("GRAPH_CACHE_BOARDS", 64))
+GRAPH_BETWEENNESS_SAMPLES = int(os.getenv("GRAPH_BETWEENNESS_SAMPLES", 64))
+SEARCH_MAX_RESULTS = 100
+SEARCH_MAX_TERMS = 8
+EXPORT_FORMAT = 1
+EXPORT_BATCH_ROWS = 2000
+EXPORT_CHUNK_BYTES = 256 * 1024
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 1024 * 1024 * 1024))
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", 16 * 1024 * 1024))
+HISTORY_PAGE_SIZE = 50
+HISTORY_SNAPSHOT_EVENTS = int(os.getenv("HISTORY_SNAPSHOT_EVENTS", 1000))
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 30))
+
+
+def gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+# Under gevent workers libpq must yield to the event loop while it waits on
+# the server instead of blocking every greenlet in the process.
+if gevent_patched():
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+
+
+def connect_db():
     return psycopg2.connect(
         host=os.getenv("DATABASE_HOST", "localhost"),
         port=int(os.getenv("DATABASE_PORT", 5432)),
@@ -37,6 +130,227 @@ def get_db():
     )
 
 
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Per-process pool of psycopg2 connections.
+
+    Connections are validated on checkout (a ``SELECT 1`` ping once they have
+    been idle longer than ``check_idle`` seconds) and recycled once older than
+    ``max_lifetime``. The pool resets itself after a fork so every gunicorn
+    worker owns its own sockets. Callers that have to wait are served in
+    arrival order, so a burst of new requests cannot starve queued ones.
+    """
+
+    def __init__(self, connect, min_size, max_size, timeout, max_lifetime, check_idle):
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_idle = check_idle
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []  # [(conn, opened_at, returned_at)]
+        self._in_use = {}  # conn -> opened_at
+        self._waiters = deque()  # one Condition per queued caller, oldest first
+        self._size = 0
+        self._warm = False
+        self._stats = {
+            "checkouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "exhausted": 0,
+            "timeouts": 0,
+            "opened": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+        }
+
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+
+    def _wake_next(self):
+        if self._waiters:
+            self._waiters[0].notify()
+
+    def _open(self):
+        conn = self._connect()
+        self._count("opened")
+        return conn, time.monotonic()
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_usable(self, conn, opened_at, returned_at):
+        now = time.monotonic()
+        if conn.closed or now - opened_at > self.max_lifetime:
+            self._count("recycled")
+            return False
+        if now - returned_at < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self._count("failed_checks")
+            return False
+
+    def _warm_up(self):
+        with self._cond:
+            if self._warm:
+                return
+            self._warm = True
+            missing = max(self.min_size - self._size, 0)
+            self._size += missing
+        opened = []
+        try:
+            for _ in range(missing):
+                conn, opened_at = self._open()
+                opened.append((conn, opened_at, opened_at))
+        finally:
+            with self._cond:
+                self._size -= missing - len(opened)
+                self._idle.extend(opened)
+                self._wake_next()
+
+    def getconn(self):
+        if self._pid != os.getpid():
+            # Inherited sockets belong to the parent: forget them, never close.
+            with self._cond:
+                self._reset()
+        if not self._warm:
+            self._warm_up()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waiter = None
+        with self._cond:
+            try:
+                while True:
+                    if not self._waiters or self._waiters[0] is waiter:
+                        if self._idle:
+                            entry = self._idle.pop()
+                            break
+                        if self._size < self.max_size:
+                            self._size += 1
+                            entry = None
+                            break
+                    if waiter is None:
+                        self._stats["exhausted"] += 1
+                        waiter = threading.Condition(self._lock)
+                        self._waiters.append(waiter)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout("No database connection available")
+                    waiter.wait(remaining)
+            finally:
+                if waiter is not None:
+                    self._waiters.remove(waiter)
+                    self._wake_next()
+
+        try:
+            if entry is not None:
+                conn, opened_at, returned_at = entry
+                if not self._is_usable(conn, opened_at, returned_at):
+                    self._close(conn)
+                    entry = None
+            if entry is None:
+                conn, opened_at = self._open()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._wake_next()
+            raise
+
+        wait = time.monotonic() - start
+        with self._cond:
+            self._in_use[conn] = opened_at
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += wait
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            opened_at = self._in_use.pop(conn, None)
+            if opened_at is None:
+                # Checked out before a fork; not ours to return.
+                return
+            if (
+                discard
+                or conn.closed
+                or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                or time.monotonic() - opened_at > self.max_lifetime
+            ):
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, opened_at, time.monotonic()))
+            self._wake_next()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                in_use=len(self._in_use),
+                idle=len(self._idle),
+                waiting=len(self._waiters),
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        return stats
+
+
+db_pool = ConnectionPool(
+    connect_db,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    max_lifetime=DB_POOL_MAX_LIFETIME,
+    check_idle=DB_POOL_CHECK_IDLE,
+)
+
+
+@contextmanager
+def db_cursor(cursor_factory=psycopg2.extras.RealDictCursor):
+    with db_pool.connection() as conn:
+        with conn.cursor(cursor_factory=cursor_factory) as cur:
+            yield cur
+
+
 def create_token(user_id):
     payload = {
         "user_id": user_id,
@@ -45,6 +359,208 @@ def create_token(user_id):
     return pyjwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
 
+class TTLCache:
+    """Bounded LRU whose entries each carry their own expiry (epoch seconds)."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                    self._removed(key, entry[0])
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value, expires_at):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            self._added(key, value)
+            while len(self._entries) > self.max_entries:
+                evicted, (evicted_value, _) = self._entries.popitem(last=False)
+                self._removed(evicted, evicted_value)
+                self._stats["evictions"] += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._removed(key, entry[0])
+
+    # Called with the lock held, for subclasses that index their entries.
+    def _added(self, key, value):
+        pass
+
+    def _removed(self, key, value):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries)
+
+
+# Verified tokens, keyed by their SHA-256 so raw tokens are not kept around;
+# an entry expires with the token itself.
+token_cache = TTLCache(TOKEN_CACHE_SIZE)
+user_cache = TTLCache(USER_CACHE_SIZE)
+
+
+def verify_token(token):
+    key = hashlib.sha256(token.encode()).digest()
+    user_id = token_cache.get(key)
+    if user_id is None:
+        payload = pyjwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        user_id = payload["user_id"]
+        token_cache.put(key, user_id, payload["exp"])
+    return user_id
+
+
+def get_user(user_id):
+    # Users are only ever created, so a short TTL is enough to pick up
+    # changes made out of band; anything that edits a user must pop it.
+    user = user_cache.get(user_id)
+    if user is None:
+        with db_cursor() as cur:
+            cur.execute("SELECT id, email FROM users WHERE id = %s", (user_id,))
+            user = cur.fetchone()
+        if user is None:
+            return None
+        user = dict(user)
+        user_cache.put(user_id, user, time.time() + USER_CACHE_TTL)
+    return user
+
+
+class WorkersBusy(Exception):
+    """Raised when a WorkerPool already has as many calls as it will queue."""
+
+
+class WorkerPool:
+    """Runs CPU-heavy calls on a few native threads, off the request path.
+
+    Under gevent the threads come from a gevent ThreadPool, so a call only
+    blocks the greenlet waiting on it. At most ``max_pending`` calls are queued
+    or running per worker process; past that callers get WorkersBusy right
+    away instead of waiting behind a burst. ``workers = 0`` runs calls inline
+    without a limit.
+    """
+
+    def __init__(self, name, workers, max_pending, busy_message):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.busy_message = busy_message
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pool = None
+        self._pid = None
+        self._rejected = 0
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            if gevent_patched():
+                import gevent.threadpool
+
+                self._pool = gevent.threadpool.ThreadPool(self.workers)
+            else:
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix=self.name)
+
+    def check_capacity(self):
+        if 0 < self.workers and self.max_pending <= self._pending:
+            with self._lock:
+                self._rejected += 1
+            raise WorkersBusy(self.busy_message)
+
+    def run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise WorkersBusy(self.busy_message)
+            self._pending += 1
+        try:
+            if self._pid != os.getpid():
+                self._start()
+            if isinstance(self._pool, concurrent.futures.Executor):
+                return self._pool.submit(fn, *args).result()
+            return self._pool.apply(fn, args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "pending": self._pending, "rejected": self._rejected}
+
+
+def check_and_rehash(pwhash, password, method, prefix):
+    # One pool job per login: verify, and upgrade a hash made with other parameters.
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split("$", 1)[0] == prefix:
+        return True, None
+    return True, generate_password_hash(password, method=method)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a WorkerPool.
+
+    hashlib's scrypt and pbkdf2 release the GIL, so a hash does not stall the
+    rest of the worker while it runs.
+    """
+
+    def __init__(self, method, workers, max_pending):
+        self.method = method
+        self.pool = WorkerPool("password", workers, max_pending, "Too many sign-in attempts, retry shortly")
+        self._lock = threading.Lock()
+        self._prefix = None
+        self._stats = {"hashed": 0, "checked": 0, "rehashed": 0}
+
+    @property
+    def prefix(self):
+        # The stored form of the configured method, e.g. "scrypt" -> "scrypt:32768:8:1".
+        if self._prefix is None:
+            self._prefix = self.pool.run(generate_password_hash, "", self.method).split("$", 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        pwhash = self.pool.run(generate_password_hash, password, self.method)
+        with self._lock:
+            self._stats["hashed"] += 1
+        return pwhash
+
+    def verify(self, pwhash, password):
+        """Return (matches, new_hash); new_hash is set when the stored hash should be replaced."""
+        prefix = self.prefix
+        ok, new_hash = self.pool.run(check_and_rehash, pwhash, password, self.method, prefix)
+        with self._lock:
+            self._stats["checked"] += 1
+            self._stats["rehashed"] += new_hash is not None
+        return ok, new_hash
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, method=self.method, **self.pool.stats())
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -53,8 +569,7 @@ def require_auth(f):
             return jsonify({"error": "Authentication required"}), 401
         token = auth_header[7:]
         try:
-            payload = pyjwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            request.user_id = payload["user_id"]
+            request.user_id = verify_token(token)
         except pyjwt.ExpiredSignatureError:
             return jsonify({"error": "Token expired"}), 401
         except pyjwt.InvalidTokenError:
@@ -64,27 +579,1330 @@ def require_auth(f):
     return decorated
 
 
-def board_belongs_to_user(board_id, user_id, cur):
-    cur.execute(
-        "SELECT id FROM boards WHERE id = %s AND user_id = %s", (board_id, user_id)
+class OwnershipCache(TTLCache):
+    """(kind, id) -> (board_id, owner_id), kept until the element is deleted.
+
+    Boards never change owner, elements never move between boards and ids are
+    never reused, so an entry can only go stale by its row being deleted; the
+    writes it guards still match on the row itself.
+    """
+
+    def __init__(self, max_entries):
+        super().__init__(max_entries)
+        self._boards = {}  # board_id -> set of keys, so a deleted board is forgotten without a scan
+
+    def _added(self, key, value):
+        self._boards.setdefault(value[0], set()).add(key)
+
+    def _removed(self, key, value):
+        keys = self._boards.get(value[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._boards[value[0]]
+
+    def forget_board(self, board_id):
+        with self._lock:
+            for key in self._boards.pop(board_id, ()):
+                del self._entries[key]
+
+
+ownership_cache = OwnershipCache(OWNERSHIP_CACHE_SIZE)
+
+OWNERSHIP_QUERIES = {
+    "board": "SELECT id, id, user_id FROM boards WHERE id = ANY(%s::int[])",
+    "card": "SELECT e.id, e.board_id, b.user_id FROM cards e JOIN boards b ON b.id = e.board_id "
+    "WHERE e.id = ANY(%s::int[])",
+    "note": "SELECT e.id, e.board_id, b.user_id FROM notes e JOIN boards b ON b.id = e.board_id "
+    "WHERE e.id = ANY(%s::int[])",
+}
+
+# Folded into UPDATE/DELETE statements on cards and notes, where board_id is
+# the outer row's column; ``%s`` is the user id.
+OWNED_BY_USER = "EXISTS (SELECT 1 FROM boards b WHERE b.id = board_id AND b.user_id = %s)"
+
+
+def owned_board_ids(cur, kind, ids, user_id):
+    """Map each of ``ids`` owned by ``user_id`` to its board id, in at most one query."""
+    owners, missing = {}, []
+    for element_id in ids:
+        entry = ownership_cache.get((kind, element_id))
+        if entry is None:
+            missing.append(element_id)
+        else:
+            owners[element_id] = entry
+    if missing:
+        with cur.connection.cursor() as lookup:
+            lookup.execute(OWNERSHIP_QUERIES[kind], (missing,))
+            for element_id, board_id, owner_id in lookup.fetchall():
+                owners[element_id] = (board_id, owner_id)
+                ownership_cache.put((kind, element_id), (board_id, owner_id), float("inf"))
+    return {
+        element_id: board_id for element_id, (board_id, owner_id) in owners.items() if owner_id == user_id
+    }
+
+
+POSITION_TABLES = {"card": "cards", "note": "notes"}
+
+
+def write_positions(cur, kind, board_id, positions):
+    # positions: {element_id: (pos_x, pos_y)}; one set-based UPDATE per table.
+    if not positions:
+        return 0
+    rows = [(element_id, x, y) for element_id, (x, y) in positions.items()]
+    psycopg2.extras.execute_values(
+        cur,
+        f"UPDATE {POSITION_TABLES[kind]} t SET pos_x = v.pos_x, pos_y = v.pos_y "
+        "FROM (VALUES %s) AS v(id, pos_x, pos_y) "
+        f"WHERE t.id = v.id AND t.board_id = {int(board_id)}",
+        rows,
+        template="(%s::int, %s::float8, %s::float8)",
+        page_size=len(rows),
     )
-    return cur.fetchone() is not None
+    return cur.rowcount
+
+
+CARD_FIELDS = (
+    "id", "title", "description", "image_path", "image_width", "image_height", "image_variants",
+    "pos_x", "pos_y", "pin_position", "inactive", "color",
+)
+CARD_COLUMNS = ", ".join(CARD_FIELDS)
+CONNECTION_FIELDS = ("id", "card_id_1", "card_id_2")
+NOTE_FIELDS = ("id", "content", "pos_x", "pos_y")
+# How far an element can reach right of and below its position, so one whose
+# corner lies above or left of a viewport but overlaps it is still returned.
+ELEMENT_EXTENT = {"cards": (210, 600), "notes": (160, 400)}
+OWNER_BOARD_FIELDS = ("id", "name", "share_token", "version")
+SHARED_BOARD_FIELDS = ("id", "name", "version")
+
 
+def negotiate_encoding():
+    return next((name for name in ("br", "gzip") if request.accept_encodings[name]), "identity")
 
-def card_belongs_to_user(card_id, user_id, cur):
+
+def compress_body(body, encoding):
+    # Dynamic responses trade some ratio for speed; static files use the maximum.
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def json_rows(alias, fields, columns):
+    # An array of row objects, or with ``columns`` one array per field so the
+    # keys are not repeated for every row.
+    if not columns:
+        return f"COALESCE(json_agg({alias}), '[]')"
+    return "json_build_object(" + ", ".join(
+        f"'{field}', COALESCE(json_agg({alias}.{field}), '[]')" for field in fields
+    ) + ")"
+
+
+def parse_bbox(value):
+    # "x0,y0,x1,y1" in board coordinates, or None when malformed.
+    try:
+        bbox = tuple(float(v) for v in value.split(","))
+    except ValueError:
+        return None
+    if len(bbox) != 4 or not all(map(math.isfinite, bbox)) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        return None
+    return bbox
+
+
+def in_viewport(table, bbox):
+    # A range on the (board_id, pos_x, pos_y) index; the pos_y bounds are
+    # checked inside the same index scan.
+    x0, y0, x1, y1 = bbox
+    width, height = ELEMENT_EXTENT[table]
+    return f"pos_x BETWEEN {x0 - width!r} AND {x1!r} AND pos_y BETWEEN {y0 - height!r} AND {y1!r}"
+
+
+def load_board_snapshot(cur, where, params, board_fields, since=None, columns=False, bbox=None):
+    # One round-trip; Postgres assembles the JSON document and we pass it through.
+    # With ``since`` only rows stamped after that board version are included,
+    # plus the ids deleted since then. With ``bbox`` only the cards and notes
+    # overlapping that region are included, with the connections attached to
+    # those cards and the cards at their far ends.
+    board_json = ", ".join(f"'{field}', b.{field}" for field in board_fields)
+    changed = connection_changed = deleted = ""
+    card_filter = connection_filter = note_filter = viewport = ""
+    if bbox is not None:
+        visible = f"SELECT id FROM cards WHERE board_id = b.id AND {in_viewport('cards', bbox)}"
+        viewport = f"""WITH attached AS (
+                    SELECT id, card_id_1, card_id_2 FROM connections WHERE card_id_1 IN ({visible})
+                    UNION
+                    SELECT id, card_id_1, card_id_2 FROM connections WHERE card_id_2 IN ({visible})
+                )"""
+        card_filter = f"""AND id IN (
+                        {visible}
+                        UNION SELECT card_id_1 FROM attached
+                        UNION SELECT card_id_2 FROM attached
+                    )"""
+        connection_filter = "AND cn.id IN (SELECT id FROM attached)"
+        note_filter = f"AND {in_viewport('notes', bbox)}"
+    if since is not None:
+        changed = f"AND version > {int(since)}"
+        connection_changed = f"AND cn.version > {int(since)}"
+        deleted = f""",
+            'since', {int(since)},
+            'deleted', (
+                SELECT json_build_object(
+                    'cards', COALESCE(json_agg(t.element_id) FILTER (WHERE t.kind = 'cards'), '[]'),
+                    'connections', COALESCE(json_agg(t.element_id) FILTER (WHERE t.kind = 'connections'), '[]'),
+                    'notes', COALESCE(json_agg(t.element_id) FILTER (WHERE t.kind = 'notes'), '[]')
+                )
+                FROM board_tombstones t
+                WHERE t.board_id = b.id AND t.version > {int(since)}
+            )"""
     cur.execute(
-        "SELECT c.id FROM cards c JOIN boards b ON b.id = c.board_id WHERE c.id = %s AND b.user_id = %s",
-        (card_id, user_id),
+        f"""
+        SELECT b.id, b.version, json_build_object(
+            'board', json_build_object({board_json}),
+            'cards', (
+                {viewport}
+                SELECT {json_rows("c", CARD_FIELDS, columns)} FROM (
+                    SELECT {CARD_COLUMNS}
+                    FROM cards WHERE board_id = b.id {changed} {card_filter}
+                ) c
+            ),
+            'connections', (
+                {viewport}
+                SELECT {json_rows("cn", CONNECTION_FIELDS, columns)} FROM (
+                    SELECT {", ".join(f"cn.{field}" for field in CONNECTION_FIELDS)}
+                    FROM connections cn
+                    WHERE cn.board_id = b.id {connection_changed} {connection_filter}
+                ) cn
+            ),
+            'notes', (
+                SELECT {json_rows("n", NOTE_FIELDS, columns)} FROM (
+                    SELECT {", ".join(NOTE_FIELDS)} FROM notes WHERE board_id = b.id {changed} {note_filter}
+                ) n
+            ){deleted}
+        )::text
+        FROM boards b
+        WHERE {where}
+        """,
+        params,
     )
-    return cur.fetchone() is not None
+    return cur.fetchone()
 
 
-def note_belongs_to_user(note_id, user_id, cur):
+def board_changes_response(cur, where, params, board_fields):
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a board version"}), 400
+    columns = request.args.get("format") == "columns"
+    row = load_board_snapshot(cur, where, params, board_fields, since=since, columns=columns)
+    if not row:
+        return None
+    _, version, changes = row
+    if since > version:
+        return jsonify({"error": "Unknown board version, reload the board", "version": version}), 409
+    response = app.response_class(changes, mimetype="application/json")
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+class SnapshotCache:
+    """LRU of serialized board snapshots keyed by (board_id, version, view, format, encoding).
+
+    A new board version simply misses; stale versions age out of the LRU.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+snapshot_cache = SnapshotCache(SNAPSHOT_CACHE_BYTES)
+
+
+def board_snapshot_response(cur, view, where, params, board_fields):
+    # A primary-key probe answers conditional requests and cache hits; the
+    # snapshot query only runs when this version has not been served before.
+    cur.execute(f"SELECT b.id, b.version FROM boards b WHERE {where}", params)
+    row = cur.fetchone()
+    if not row:
+        return None
+    board_id, version = row
+    fmt = "columns" if request.args.get("format") == "columns" else "rows"
+    bbox = None
+    if "bbox" in request.args:
+        bbox = parse_bbox(request.args["bbox"])
+        if bbox is None:
+            return jsonify({"error": "bbox must be x0,y0,x1,y1 with x0 <= x1 and y0 <= y1"}), 400
+        fmt += ".bbox=" + ",".join(map(repr, bbox))
+    etag = f"{board_id}.{version}.{view}.{fmt}"
+    encoding = negotiate_encoding()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    elif bbox is not None:
+        # Viewports rarely repeat exactly: not cached, compressed on the way out.
+        row = load_board_snapshot(
+            cur, "b.id = %s", (board_id,), board_fields, columns=fmt.startswith("columns"), bbox=bbox
+        )
+        if not row:
+            return None
+        board_id, version, snapshot = row
+        etag = f"{board_id}.{version}.{view}.{fmt}"
+        response = app.response_class(snapshot, mimetype="application/json")
+    else:
+        # Compressed bodies are cached next to the plain one, so a hit costs
+        # neither the query nor the compression.
+        body = snapshot_cache.get((board_id, version, view, fmt, encoding))
+        if body is None:
+            plain = snapshot_cache.get((board_id, version, view, fmt, "identity")) if encoding != "identity" else None
+            if plain is None:
+                row = load_board_snapshot(cur, "b.id = %s", (board_id,), board_fields, columns=fmt == "columns")
+                if not row:
+                    return None
+                board_id, version, snapshot = row
+                plain = snapshot.encode()
+                etag = f"{board_id}.{version}.{view}.{fmt}"
+                snapshot_cache.put((board_id, version, view, fmt, "identity"), plain)
+            if len(plain) < COMPRESS_MIN_BYTES:
+                encoding = "identity"
+            body = plain
+            if encoding != "identity":
+                body = compress_body(plain, encoding)
+                snapshot_cache.put((board_id, version, view, fmt, encoding), body)
+        response = app.response_class(body, mimetype="application/json")
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache" if view == "owner" else "no-cache"
+    return response
+
+
+class PositionBuffer:
+    """Coalesces moves and writes them to Postgres in batches.
+
+    Positions are last-writer-wins, so only the latest value per element is
+    kept. A background thread flushes everything every ``interval`` seconds;
+    board reads flush their own board synchronously first.
+
+    Pending moves live in this process, where only its own reads can flush
+    them, so buffering needs a single worker: gunicorn.conf.py sets
+    POSITION_FLUSH_INTERVAL=0 when it starts more. Writes that bypass the
+    buffer (layout, history, edits carrying a position) discard the moves
+    pending for the elements they write.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # board_id -> {kind: {element_id: (pos_x, pos_y)}}
+        self._pid = None
+        self._stats = {"received": 0, "written": 0, "flushes": 0}
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending = {}
+        threading.Thread(target=self._run, name="position-flush", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                app.logger.exception("Position flush failed")
+
+    def add(self, board_id, kind, positions):
+        # positions: {element_id: (pos_x, pos_y)}
+        if self._pid != os.getpid():
+            self._start()
+        with self._lock:
+            board = self._pending.setdefault(board_id, {k: {} for k in POSITION_TABLES})
+            board[kind].update(positions)
+            self._stats["received"] += len(positions)
+
+    def pop(self, kind, element_id):
+        with self._lock:
+            for kinds in self._pending.values():
+                if element_id in kinds[kind]:
+                    return kinds[kind].pop(element_id)
+        return None
+
+    def discard(self, kind, element_ids, board_id=None):
+        with self._lock:
+            boards = [self._pending.get(board_id)] if board_id is not None else list(self._pending.values())
+            for kinds in boards:
+                if kinds is not None:
+                    for element_id in element_ids:
+                        kinds[kind].pop(element_id, None)
+
+    def _requeue(self, batch):
+        with self._lock:
+            for board_id, kinds in batch.items():
+                board = self._pending.setdefault(board_id, {k: {} for k in POSITION_TABLES})
+                for kind, positions in kinds.items():
+                    for element_id, pos in positions.items():
+                        board[kind].setdefault(element_id, pos)
+
+    def _write(self, cur, batch):
+        written = 0
+        for board_id, kinds in batch.items():
+            for kind, positions in kinds.items():
+                write_positions(cur, kind, board_id, positions)
+                written += len(positions)
+        return written
+
+    def flush(self, board_id=None, cur=None):
+        # Flushes are serialized so an older batch can never land after a newer one.
+        with self._flush_lock:
+            with self._lock:
+                if board_id is None:
+                    batch, self._pending = self._pending, {}
+                elif board_id in self._pending:
+                    batch = {board_id: self._pending.pop(board_id)}
+                else:
+                    batch = {}
+            if not batch:
+                return
+            try:
+                if cur is not None:
+                    written = self._write(cur, batch)
+                else:
+                    with db_cursor(cursor_factory=None) as own_cur:
+                        written = self._write(own_cur, batch)
+            except BaseException:
+                self._requeue(batch)
+                raise
+            with self._lock:
+                self._stats["written"] += written
+                self._stats["flushes"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = sum(
+                len(positions) for kinds in self._pending.values() for positions in kinds.values()
+            )
+        stats["interval"] = self.interval
+        return stats
+
+
+position_buffer = PositionBuffer(POSITION_FLUSH_INTERVAL)
+atexit.register(position_buffer.flush)
+
+
+class Subscription:
+    """Latest-value mailbox for one event-stream client.
+
+    Publishing overwrites the pending value instead of queueing, so a slow
+    client costs one slot no matter how many changes it misses.
+    """
+
+    def __init__(self, board_id):
+        self.board_id = board_id
+        self._cond = threading.Condition()
+        self._pending = None
+
+    def publish(self, event):
+        with self._cond:
+            self._pending = event
+            self._cond.notify()
+
+    def wait(self, timeout):
+        with self._cond:
+            if self._pending is None:
+                self._cond.wait(timeout)
+            event, self._pending = self._pending, None
+            return event
+
+
+class BoardEvents:
+    """Fans out ``board_changes`` notifications to subscribers in this worker.
+
+    One dedicated LISTEN connection per process (outside the pool) feeds every
+    subscriber, however many clients are connected.
+    """
+
+    channel = "board_changes"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # board_id -> set[Subscription]
+        self._pid = None
+        self._backoff = 1
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._subscribers = {}
+        threading.Thread(target=self._run, name="board-events", daemon=True).start()
+
+    def subscribe(self, board_id):
+        if self._pid != os.getpid():
+            self._start()
+        sub = Subscription(board_id)
+        with self._lock:
+            self._subscribers.setdefault(board_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.board_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.board_id]
+
+    def publish(self, board_id, event):
+        with self._lock:
+            subs = list(self._subscribers.get(board_id, ()))
+        for sub in subs:
+            sub.publish(event)
+
+    def _publish_all(self, event):
+        with self._lock:
+            subs = [sub for board_subs in self._subscribers.values() for sub in board_subs]
+        for sub in subs:
+            sub.publish(event)
+
+    def _listen(self):
+        conn = connect_db()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {self.channel}")
+            # Connected again: the next outage starts from a short wait.
+            self._backoff = 1
+            # Anything published while we were disconnected is lost: make every
+            # client re-check its board.
+            self._publish_all({"event": "version", "version": None})
+            while True:
+                if select.select([conn], [], [], SSE_HEARTBEAT) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    board_id, _, value = notify.payload.partition(":")
+                    if value == "deleted":
+                        event = {"event": "deleted"}
+                    else:
+                        event = {"event": "version", "version": int(value)}
+                    self.publish(int(board_id), event)
+        finally:
+            conn.close()
+
+    def _run(self):
+        self._backoff = 1
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                app.logger.exception("Board event listener failed, reconnecting")
+            time.sleep(self._backoff)
+            self._backoff = min(self._backoff * 2, 30)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "boards": len(self._subscribers),
+                "subscribers": sum(len(subs) for subs in self._subscribers.values()),
+            }
+
+
+board_events = BoardEvents()
+
+
+def sse_message(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def board_event_stream(board_id, version):
+    sub = board_events.subscribe(board_id)
+
+    def stream():
+        try:
+            # Streams end on their own so no worker is pinned indefinitely;
+            # EventSource reconnects transparently.
+            yield "retry: 3000\n" + sse_message("version", {"version": version}, version)
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                event = sub.wait(min(SSE_HEARTBEAT, max(deadline - time.monotonic(), 0)))
+                if event is None:
+                    yield ": ping\n\n"
+                elif event["event"] == "deleted":
+                    yield sse_message("deleted", {})
+                    return
+                else:
+                    yield sse_message("version", {"version": event["version"]}, event["version"])
+        finally:
+            board_events.unsubscribe(sub)
+
+    response = app.response_class(stream(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadStream:
+    """Temp file in UPLOAD_FOLDER receiving one uploaded file part.
+
+    The bytes are hashed, counted and sniffed while the request body is
+    parsed, so an upload is read once, never held in memory, and rejected as
+    soon as it is known to be too large or not an image.
+    """
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix=".", suffix=".tmp")
+        self._file = os.fdopen(fd, "w+b")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.kind = None
+        self._head = b""
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > UPLOAD_MAX_BYTES:
+            raise UploadRejected(f"Images must be at most {UPLOAD_MAX_BYTES // (1024 * 1024)} MB", 413)
+        if self.kind is None:
+            self._head += data[: 8 - len(self._head)]
+            if len(self._head) == 8:
+                self.kind = next(
+                    (kind for sig, kind in IMAGE_SIGNATURES.items() if self._head.startswith(sig)), None
+                )
+                if self.kind is None:
+                    raise UploadRejected("Only jpg/png images are accepted")
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        stream = UploadStream()
+        self.__dict__.setdefault("upload_streams", []).append(stream)
+        return stream
+
+    def close(self):
+        for stream in self.__dict__.get("upload_streams", ()):
+            stream.discard()
+        super().close()
+
+
+app.request_class = UploadRequest
+
+
+def save_upload(stream, cur):
+    # Files are named after the SHA-256 of their bytes, so the same image
+    # attached to many cards is stored once. The uploads row is locked before
+    # the file is published; the GC takes the same lock before deleting.
+    if stream.kind is None:
+        raise UploadRejected("Only jpg/png images are accepted")
+    stream.flush()
+    filename = f"{stream.digest.hexdigest()}.{stream.kind}"
+    image_path = f"/static/uploads/{filename}"
     cur.execute(
-        "SELECT n.id FROM notes n JOIN boards b ON b.id = n.board_id WHERE n.id = %s AND b.user_id = %s",
-        (note_id, user_id),
+        "INSERT INTO uploads (path) VALUES (%s) "
+        "ON CONFLICT (path) DO UPDATE SET path = EXCLUDED.path",
+        (image_path,),
     )
-    return cur.fetchone() is not None
+    target = os.path.join(UPLOAD_FOLDER, filename)
+    if os.path.exists(target):
+        os.utime(target)
+    else:
+        os.replace(stream.path, target)
+    return image_path
+
+
+def upload_files(image_path):
+    """The stored file of ``image_path`` plus every variant rendered from it."""
+    stem = os.path.basename(image_path).split(".", 1)[0]
+    return [
+        entry for entry in os.scandir(UPLOAD_FOLDER)
+        if entry.is_file() and entry.name.split(".", 1)[0] == stem
+    ]
+
+
+def run_blocking(fn, *args):
+    # Under gevent, CPU-bound work goes to the hub's native thread pool so it
+    # does not stall every other request in the worker.
+    if gevent_patched():
+        import gevent
+
+        return gevent.get_hub().threadpool.apply(fn, args)
+    return fn(*args)
+
+
+def render_image_variants(image_path):
+    filename = os.path.basename(image_path)
+    stem = filename.rsplit(".", 1)[0]
+    with Image.open(os.path.join(UPLOAD_FOLDER, filename)) as original:
+        width, height = original.size
+        if original.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEGs decode straight at a reduced scale when the largest variant allows it.
+        scale = min(1.0, max(IMAGE_VARIANT_SIZES.values()) / max(original.size))
+        original.draft("RGB", (round(original.width * scale), round(original.height * scale)))
+        # The rotation is baked into the pixels; variants are saved without metadata.
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        variants = {}
+        for name, bound in IMAGE_VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((bound, bound), Image.Resampling.LANCZOS)
+            variant = {"width": resized.width, "height": resized.height}
+            for fmt in IMAGE_VARIANT_FORMATS:
+                variant_name = f"{stem}.{name}.{fmt}"
+                fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix=".", suffix=".tmp")
+                with os.fdopen(fd, "wb") as out:
+                    resized.save(out, fmt.upper(), quality=IMAGE_QUALITY)
+                os.replace(tmp_path, os.path.join(UPLOAD_FOLDER, variant_name))
+                variant[fmt] = f"/static/uploads/{variant_name}"
+            variants[name] = variant
+    return width, height, variants
+
+
+class ImageProcessor:
+    """Renders card image variants on background threads, off the request path.
+
+    Jobs are kept in memory only: ``flask process-images`` picks up any card
+    still missing its variants after a restart.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._stats = {"submitted": 0, "processed": 0, "reused": 0, "failed": 0}
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue()
+        for i in range(self.workers):
+            threading.Thread(target=self._run, name=f"image-{i}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            card_id, image_path = self._queue.get()
+            try:
+                self.process(card_id, image_path)
+            except Exception:
+                app.logger.exception("Image processing failed for card %s", card_id)
+
+    def submit(self, card_id, image_path):
+        with self._lock:
+            self._stats["submitted"] += 1
+        if not self.enabled:
+            self.process(card_id, image_path)
+            return
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((card_id, image_path))
+
+    def process(self, card_id, image_path):
+        # Another card with the same file may already have its variants.
+        with db_cursor(cursor_factory=None) as cur:
+            cur.execute(
+                """
+                UPDATE cards c
+                SET image_width = s.image_width, image_height = s.image_height, image_variants = s.image_variants
+                FROM (
+                    SELECT image_width, image_height, image_variants FROM cards
+                    WHERE image_path = %s AND image_variants IS NOT NULL LIMIT 1
+                ) s
+                WHERE c.id = %s AND c.image_path = %s
+                """,
+                (image_path, card_id, image_path),
+            )
+            if cur.rowcount:
+                with self._lock:
+                    self._stats["reused"] += 1
+                return
+        try:
+            width, height, variants = run_blocking(render_image_variants, image_path)
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        # The image may have been replaced meanwhile; only the current one is recorded.
+        with db_cursor(cursor_factory=None) as cur:
+            cur.execute(
+                "UPDATE cards SET image_width = %s, image_height = %s, image_variants = %s "
+                "WHERE id = %s AND image_path = %s",
+                (width, height, psycopg2.extras.Json(variants), card_id, image_path),
+            )
+        with self._lock:
+            self._stats["processed"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+        stats["workers"] = self.workers
+        stats["formats"] = IMAGE_VARIANT_FORMATS
+        return stats
+
+
+image_processor = ImageProcessor(IMAGE_WORKERS)
+
+
+@lru_cache(maxsize=None)
+def layout_kernels(size):
+    # Far-field repulsion between grid cells as an FFT convolution kernel
+    # (force ~ 1/distance); the 3x3 neighbourhood is left to exact pairs.
+    offsets = np.arange(-size, size)
+    dx, dy = np.meshgrid(offsets, offsets, indexing="ij")
+    r2 = (dx * dx + dy * dy).astype(float)
+    r2[(abs(dx) <= 1) & (abs(dy) <= 1)] = np.inf
+    return np.fft.rfft2(np.fft.ifftshift(dx / r2)), np.fft.rfft2(np.fft.ifftshift(dy / r2))
+
+# Half of the 3x3 stencil: pairs in neighbouring cells are visited once.
+NEIGHBOUR_OFFSETS = np.array([(0, 1), (1, -1), (1, 0), (1, 1)])
+
+
+def ramp(counts):
+    # [0..c0-1, 0..c1-1, ...] for the given run lengths.
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def force_layout(positions, edges, fixed, spacing, budget, iterations, seed=0):
+    """Fruchterman-Reingold layout of ``positions`` (n x 2); returns (positions, iterations run).
+
+    Repulsion is computed exactly between cards in the same or adjacent grid
+    cells and through a particle-mesh FFT for the rest, so an iteration costs
+    O(n + edges + grid log grid). Gravity towards the centre keeps components
+    together, and the temperature cools over whichever runs out first, the
+    iterations or the time budget. ``fixed`` cards push and pull but stay put.
+    """
+    started = time.monotonic()
+    pos = np.array(positions, dtype=float).reshape(-1, 2)
+    n = len(pos)
+    movable = ~np.asarray(fixed, dtype=bool)
+    if not movable.any():
+        return pos, 0
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    a, b = edges[:, 0], edges[:, 1]
+    k = float(spacing)
+    # About two cells per card along each axis, so small boards get a small FFT.
+    grid = min(LAYOUT_MAX_GRID, 2 ** math.ceil(math.log2(max(2 * math.sqrt(n), 16))))
+    kernel_x, kernel_y = layout_kernels(grid)
+    # Spread cramped boards to roughly one card per k^2 first, and break ties
+    # between cards sharing a position.
+    centre = pos.mean(axis=0)
+    side = np.sqrt(n) * k
+    extent = np.ptp(pos[movable], axis=0).max()
+    if extent < side:
+        pos[movable] = centre + (pos[movable] - centre) * (side / max(extent, 1.0))
+    pos[movable] += np.random.default_rng(seed).uniform(-k / 10, k / 10, (movable.sum(), 2))
+    # Dense graphs would otherwise collapse under their own springs.
+    attraction = 1 / max(2 * len(edges) / n, 1)
+    start_temperature = side / 10
+    done = 0
+    while done < iterations:
+        progress = max(done / iterations, (time.monotonic() - started) / budget)
+        if progress >= 1:
+            break
+        done += 1
+        x, y = pos[:, 0], pos[:, 1]
+        # Cells at least k wide, indexed from 1 so every neighbour is on the grid.
+        cell_size = max(np.ptp(pos, axis=0).max() / (grid - 3), k)
+        cell = ((pos - pos.min(axis=0)) / cell_size).astype(np.int64) + 1
+        flat = cell[:, 0] * grid + cell[:, 1]
+        occupancy = np.bincount(flat, minlength=grid * grid)
+        density = np.zeros((2 * grid, 2 * grid))
+        density[:grid, :grid] = occupancy.reshape(grid, grid)
+        spectrum = np.fft.rfft2(density)
+        field_x = np.fft.irfft2(spectrum * kernel_x, density.shape)[:grid, :grid].ravel()
+        field_y = np.fft.irfft2(spectrum * kernel_y, density.shape)[:grid, :grid].ravel()
+        scale = k * k / cell_size
+        disp_x = field_x[flat] * scale
+        disp_y = field_y[flat] * scale
+
+        order = np.argsort(flat, kind="stable")
+        first = np.cumsum(occupancy) - occupancy
+        same = occupancy[flat]
+        i = np.repeat(np.arange(n), same)
+        j = order[np.repeat(first[flat], same) + ramp(same)]
+        pairs_i, pairs_j = [i[i < j]], [j[i < j]]
+        for dx, dy in NEIGHBOUR_OFFSETS:
+            target = flat + dx * grid + dy
+            count = occupancy[target]
+            pairs_i.append(np.repeat(np.arange(n), count))
+            pairs_j.append(order[np.repeat(first[target], count) + ramp(count)])
+        i, j = np.concatenate(pairs_i), np.concatenate(pairs_j)
+        delta_x, delta_y = x[i] - x[j], y[i] - y[j]
+        weight = k * k / np.maximum(delta_x * delta_x + delta_y * delta_y, 1.0)
+        push_x, push_y = delta_x * weight, delta_y * weight
+        disp_x += np.bincount(i, push_x, n) - np.bincount(j, push_x, n)
+        disp_y += np.bincount(i, push_y, n) - np.bincount(j, push_y, n)
+
+        delta_x, delta_y = x[a] - x[b], y[a] - y[b]
+        weight = np.sqrt(delta_x * delta_x + delta_y * delta_y) * (attraction / k)
+        pull_x, pull_y = delta_x * weight, delta_y * weight
+        disp_x += np.bincount(b, pull_x, n) - np.bincount(a, pull_x, n)
+        disp_y += np.bincount(b, pull_y, n) - np.bincount(a, pull_y, n)
+        disp_x -= x - centre[0]
+        disp_y -= y - centre[1]
+
+        temperature = start_temperature * (1 - progress)
+        length = np.maximum(np.sqrt(disp_x * disp_x + disp_y * disp_y), 1e-9)
+        step = np.minimum(length, temperature) / length * movable
+        pos[:, 0] += disp_x * step
+        pos[:, 1] += disp_y * step
+    return pos, done
+
+
+layout_pool = WorkerPool("layout", LAYOUT_WORKERS, LAYOUT_MAX_PENDING, "A layout is already running, retry shortly")
+
+
+def lookup(ids, values):
+    """Positions of ``values`` in the sorted ``ids`` array, and which were found."""
+    position = np.searchsorted(ids, values).clip(max=max(len(ids) - 1, 0))
+    found = ids[position] == values if len(ids) else np.zeros(np.shape(values), dtype=bool)
+    return position, found
+
+
+class BoardGraph:
+    """A board's cards and connections as an undirected graph in CSR form.
+
+    Nodes are positions in the sorted ``ids`` array; ``indices[indptr[i]:indptr[i + 1]]``
+    are the neighbours of node i, each edge stored once per direction with
+    its connection id in ``edge``. Instances are never modified: ``updated``
+    returns a new graph, so readers need no lock.
+    """
+
+    def __init__(self, version, ids, source, indices, edge):
+        self.version = version
+        self.ids = ids
+        self.source = source
+        self.indices = indices
+        self.edge = edge
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(source, minlength=len(ids)))])
+        self._betweenness = None
+
+    @classmethod
+    def build(cls, version, cards, connections):
+        empty = np.zeros(0, dtype=np.int64)
+        return cls(0, empty, empty, empty, empty).updated(version, cards, connections, (), ())
+
+    def updated(self, version, cards, connections, deleted_cards, deleted_connections):
+        """Apply changed cards, changed (id, card, card) connections and deletions.
+
+        Surviving entries keep their order, since node positions only shift
+        monotonically, so only the new connections are sorted and merged in.
+        """
+        connections = np.asarray(connections, dtype=np.int64).reshape(-1, 3)
+        cards = np.unique(np.asarray(cards, dtype=np.int64))
+        # Undo and restore bring rows back under their old ids, so one delta
+        # can hold both a tombstone and the live row; the row wins.
+        deleted_cards = set(deleted_cards).difference(cards.tolist())
+        deleted_connections = set(deleted_connections).difference(connections[:, 0].tolist())
+        cards = cards[~lookup(self.ids, cards)[1]]
+        ids = np.insert(self.ids, np.searchsorted(self.ids, cards), cards)
+        if deleted_cards:
+            ids = ids[~np.isin(ids, list(deleted_cards))]
+        removed = np.concatenate([np.asarray(list(deleted_connections), dtype=np.int64), connections[:, 0]])
+        keep = ~np.isin(self.edge, removed)
+        source, indices = self.source, self.indices
+        if len(ids) != len(self.ids) or len(cards):
+            position, alive = lookup(ids, self.ids)
+            keep &= alive[source] & alive[indices]
+            source, indices = position[source], position[indices]
+        if not keep.all():
+            source, indices = source[keep], indices[keep]
+        edge = self.edge[keep]
+
+        ends, known = lookup(ids, connections[:, 1:])
+        ends, added = ends[known.all(axis=1)], connections[known.all(axis=1), 0]
+        new_source = np.concatenate([ends[:, 0], ends[:, 1]])
+        order = np.argsort(new_source, kind="stable")
+        at = np.searchsorted(source, new_source[order], side="right")
+        source = np.insert(source, at, new_source[order])
+        indices = np.insert(indices, at, np.concatenate([ends[:, 1], ends[:, 0]])[order])
+        edge = np.insert(edge, at, np.concatenate([added, added])[order])
+        return BoardGraph(version, ids, source, indices, edge)
+
+    def node(self, card_id):
+        position, found = lookup(self.ids, np.array([card_id]))
+        return int(position[0]) if found[0] else None
+
+    def neighbours(self, nodes):
+        # (node, neighbour) for every edge leaving ``nodes``.
+        starts = self.indptr[nodes]
+        counts = self.indptr[nodes + 1] - starts
+        return np.repeat(nodes, counts), self.indices[np.repeat(starts, counts) + ramp(counts)]
+
+    def shortest_path(self, source, target):
+        """Card ids along a fewest-hops path, or None when the cards are not linked."""
+        parent = np.full(len(self.ids), -1, dtype=np.int64)
+        parent[source] = source
+        frontier = np.array([source])
+        while len(frontier) and parent[target] < 0:
+            origin, reached = self.neighbours(frontier)
+            new = parent[reached] < 0
+            origin, reached = origin[new], reached[new]
+            parent[reached] = origin  # any parent on the previous level will do
+            frontier = np.unique(reached)
+        if parent[target] < 0:
+            return None
+        path = [target]
+        while path[-1] != source:
+            path.append(int(parent[path[-1]]))
+        return [int(card_id) for card_id in self.ids[path[::-1]]]
+
+    def components(self):
+        """Connected components as arrays of card ids, largest first; isolated cards are left out."""
+        # Hook each edge's larger root under the smaller one, then flatten
+        # the trees by pointer jumping until no edge spans two roots.
+        root = np.arange(len(self.ids))
+        while True:
+            ra, rb = root[self.source], root[self.indices]
+            if (ra == rb).all():
+                break
+            np.minimum.at(root, np.maximum(ra, rb), np.minimum(ra, rb))
+            while True:
+                jumped = root[root]
+                if (jumped == root).all():
+                    break
+                root = jumped
+        _, inverse, sizes = np.unique(root, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        groups = np.split(self.ids[order], np.cumsum(sizes)[:-1])
+        return sorted((group for group in groups if len(group) > 1), key=len, reverse=True)
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def betweenness(self, samples):
+        """Normalized betweenness per node, by Brandes' algorithm.
+
+        Exact when the board has at most ``samples`` cards; otherwise estimated
+        from that many source cards, chosen deterministically per version.
+        """
+        if self._betweenness is not None:
+            return self._betweenness
+        n = len(self.ids)
+        sources = np.arange(n)
+        if n > samples:
+            sources = np.random.default_rng(self.version).choice(n, samples, replace=False)
+        centrality = np.zeros(n)
+        for source in sources:
+            distance = np.full(n, -1)
+            distance[source] = 0
+            paths = np.zeros(n)
+            paths[source] = 1
+            levels = []
+            frontier = np.array([source])
+            while len(frontier):
+                origin, reached = self.neighbours(frontier)
+                distance[reached[distance[reached] < 0]] = distance[frontier[0]] + 1
+                onward = distance[reached] == distance[frontier[0]] + 1
+                origin, reached = origin[onward], reached[onward]
+                paths += np.bincount(reached, paths[origin], n)
+                levels.append((origin, reached))
+                frontier = np.unique(reached)
+            dependency = np.zeros(n)
+            for origin, reached in reversed(levels):
+                dependency += np.bincount(origin, paths[origin] / paths[reached] * (1 + dependency[reached]), n)
+            dependency[source] = 0
+            centrality += dependency
+        if n > 2:
+            centrality *= n / len(sources) / ((n - 1) * (n - 2))
+        self._betweenness = centrality
+        return centrality
+
+
+class GraphCache:
+    """LRU of BoardGraph per board, caught up with the board's changes on use.
+
+    A stale graph applies only the rows stamped after its version and the
+    tombstones left since, like the /changes delta, so edits made by any
+    worker are picked up without reloading the board.
+    """
+
+    def __init__(self, max_boards):
+        self.max_boards = max_boards
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "loads": 0, "updates": 0}
+
+    def get(self, cur, board_id, version):
+        with self._lock:
+            graph = self._entries.get(board_id)
+        if graph is not None and graph.version == version:
+            stat = "hits"
+        elif graph is not None and graph.version < version:
+            graph = graph.updated(version, *self._load(cur, board_id, graph.version))
+            stat = "updates"
+        else:
+            cards, connections, _, _ = self._load(cur, board_id, None)
+            graph = BoardGraph.build(version, cards, connections)
+            stat = "loads"
+        with self._lock:
+            self._stats[stat] += 1
+            if self.max_boards > 0:
+                current = self._entries.get(board_id)
+                if current is None or current.version <= graph.version:
+                    self._entries[board_id] = graph
+                self._entries.move_to_end(board_id)
+                while len(self._entries) > self.max_boards:
+                    self._entries.popitem(last=False)
+        return graph
+
+    def _load(self, cur, board_id, since):
+        changed = "" if since is None else f"AND version > {int(since)}"
+        cur.execute(f"SELECT id FROM cards WHERE board_id = %s {changed}", (board_id,))
+        cards = [row[0] for row in cur.fetchall()]
+        cur.execute(
+            f"SELECT id, card_id_1, card_id_2 FROM connections WHERE board_id = %s {changed}", (board_id,)
+        )
+        connections = cur.fetchall()
+        deleted = {"cards": set(), "connections": set()}
+        if since is not None:
+            cur.execute(
+                "SELECT kind, element_id FROM board_tombstones "
+                "WHERE board_id = %s AND version > %s AND kind IN ('cards', 'connections')",
+                (board_id, since),
+            )
+            for kind, element_id in cur.fetchall():
+                deleted[kind].add(element_id)
+        return cards, connections, deleted["cards"], deleted["connections"]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, boards=len(self._entries), max_boards=self.max_boards)
+
+
+graph_cache = GraphCache(GRAPH_CACHE_BOARDS)
+
+
+class AssetStore:
+    """Fingerprints the files under static/ (uploads aside) and assets/.
+
+    Text files are kept in memory together with gzip and brotli variants, and
+    stylesheet references to /assets/ are rewritten to fingerprinted URLs.
+    An entry is rebuilt whenever its file changes on disk.
+    """
+
+    def __init__(self, roots):
+        self.roots = roots  # URL prefix -> directory
+        self._lock = threading.Lock()
+        self._entries = {}  # (root, filename) -> entry
+
+    def _build(self, root, filename, path, mtime):
+        with open(path, "rb") as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        if mimetype == "text/css":
+            data = CSS_ASSET_URL.sub(
+                lambda m: f"url({m.group(1)}{self.url('assets', m.group(2))}{m.group(1)})", data.decode()
+            ).encode()
+        entry = {
+            "path": path,
+            "mtime": mtime,
+            "mimetype": mimetype,
+            "digest": hashlib.sha256(data).hexdigest()[:16],
+            "encodings": None,
+        }
+        if mimetype in COMPRESSIBLE_TYPES:
+            encodings = {
+                "br": brotli.compress(data, quality=11),
+                "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+            }
+            entry["encodings"] = {
+                "identity": data,
+                **{name: body for name, body in encodings.items() if len(body) < len(data)},
+            }
+        return entry
+
+    def get(self, root, filename):
+        directory = self.roots.get(root)
+        path = safe_join(directory, filename) if directory else None
+        if path is None or (root == "static" and filename.startswith("uploads/")):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        key = (root, filename)
+        entry = self._entries.get(key)
+        if entry is None or entry["mtime"] != stat.st_mtime_ns:
+            entry = self._build(root, filename, path, stat.st_mtime_ns)
+            with self._lock:
+                self._entries[key] = entry
+        return entry
+
+    def url(self, root, filename):
+        entry = self.get(root, filename)
+        return f"/{root}/{filename}" + (f"?v={entry['digest']}" if entry else "")
+
+    def warm(self):
+        for root, directory in self.roots.items():
+            for dirpath, dirnames, filenames in os.walk(directory):
+                dirnames[:] = [d for d in dirnames if not (root == "static" and d == "uploads")]
+                for name in filenames:
+                    self.get(root, os.path.relpath(os.path.join(dirpath, name), directory))
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "files": len(entries),
+            "in_memory_bytes": sum(
+                len(body) for entry in entries for body in (entry["encodings"] or {}).values()
+            ),
+        }
+
+
+asset_store = AssetStore({"static": app.static_folder, "assets": os.path.join(app.root_path, "assets")})
+asset_store.warm()
+
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    root = {"static": "static", "serve_assets": "assets"}.get(endpoint)
+    if root and "filename" in values and "v" not in values:
+        entry = asset_store.get(root, values["filename"])
+        if entry:
+            values["v"] = entry["digest"]
+
+
+def send_static_path(path, offload_path):
+    # With STATIC_OFFLOAD the front proxy streams the file; gunicorn only
+    # answers with the header pointing at it.
+    if STATIC_OFFLOAD == "x-accel":
+        response = app.response_class(
+            mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream"
+        )
+        response.headers["X-Accel-Redirect"] = f"{X_ACCEL_PREFIX}/{offload_path}"
+        return response
+    return send_file(path, conditional=True)
+
+
+def asset_response(root, filename):
+    entry = asset_store.get(root, filename)
+    if entry is None:
+        abort(404)
+    if entry["encodings"] is None:
+        response = send_static_path(entry["path"], f"{root}/{filename}")
+    else:
+        encoding = next(
+            (name for name in ("br", "gzip") if name in entry["encodings"] and request.accept_encodings[name]),
+            "identity",
+        )
+        body = entry["encodings"][encoding]
+        response = app.response_class(body, mimetype=entry["mimetype"])
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.set_etag(f"{entry['digest']}-{encoding}")
+        response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+    fingerprinted = request.args.get("v") == entry["digest"]
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE if fingerprinted else "no-cache"
+    return response
+
+
+def upload_response(filename):
+    path = safe_join(UPLOAD_FOLDER, filename)
+    if path is None or os.path.basename(path).startswith(".") or not os.path.isfile(path):
+        abort(404)
+    response = send_static_path(path, f"uploads/{filename}")
+    # Upload names are content hashes (random ids for older uploads): a URL
+    # never changes meaning.
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE
+    return response
+
+
+def is_position_only(data):
+    return position_buffer.enabled and isinstance(data, dict) and set(data) == {"pos_x", "pos_y"}
+
+
+def buffer_position_update(kind, element_id, data, cur):
+    # Buffers a move checked with is_position_only.
+    board_id = owned_board_ids(cur, kind, [element_id], request.user_id).get(element_id)
+    if board_id is None:
+        return jsonify({"error": f"{kind.capitalize()} not found"}), 404
+    pos = (float(data["pos_x"]), float(data["pos_y"]))
+    position_buffer.add(board_id, kind, {element_id: pos})
+    return jsonify({"id": element_id, "pos_x": pos[0], "pos_y": pos[1]}), 202
+
+
+def merge_pending_position(cur, kind, element_id, fields, values):
+    # A regular UPDATE supersedes whatever move is still waiting in the buffer;
+    # only the owner's UPDATE may take it over.
+    if not position_buffer.enabled:
+        return
+    if element_id not in owned_board_ids(cur, kind, [element_id], request.user_id):
+        return
+    pending = position_buffer.pop(kind, element_id)
+    for field, value in zip(("pos_x", "pos_y"), pending or ()):
+        if f"{field} = %s" not in fields:
+            fields.append(f"{field} = %s")
+            values.append(value)
 
 
 @app.route("/health")
@@ -92,9 +1910,77 @@ def health():
     return jsonify({"message": "OK"})
 
 
+@app.route("/health/db")
+def health_db():
+    return jsonify(
+        {
+            "pool": db_pool.stats(),
+            "position_buffer": position_buffer.stats(),
+            "snapshot_cache": snapshot_cache.stats(),
+            "board_events": board_events.stats(),
+            "image_processor": image_processor.stats(),
+            "assets": asset_store.stats(),
+            "token_cache": token_cache.stats(),
+            "user_cache": user_cache.stats(),
+            "ownership_cache": ownership_cache.stats(),
+            "password_hasher": password_hasher.stats(),
+            "layout_pool": layout_pool.stats(),
+            "graph_cache": graph_cache.stats(),
+        }
+    )
+
+
+@app.after_request
+def compress_response(response):
+    if (
+        response.status_code not in (200, 201)
+        or request.endpoint in ("static", "serve_assets")
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = negotiate_encoding()
+    if encoding == "identity" or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(compress_body(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    return jsonify({"error": "Service busy, retry shortly"}), 503
+
+
+@app.errorhandler(WorkersBusy)
+def workers_busy(e):
+    return jsonify({"error": str(e)}), 429, {"Retry-After": "1"}
+
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    return jsonify({"error": e.message}), e.status
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "Request too large"}), 413
+
+
 @app.route("/assets/<path:filename>")
 def serve_assets(filename):
-    return send_from_directory("assets", filename)
+    return asset_response("assets", filename)
+
+
+@app.endpoint("static")
+def serve_static(filename):
+    if filename.startswith("uploads/"):
+        return upload_response(filename.removeprefix("uploads/"))
+    return asset_response("static", filename)
 
 
 @app.route("/")
@@ -109,12 +1995,9 @@ def board():
 
 @app.route("/share/<token>")
 def share_board(token):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM boards WHERE share_token = %s", (token,))
-    row = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute("SELECT id FROM boards WHERE share_token = %s", (token,))
+        row = cur.fetchone()
     if not row:
         return render_template("404.html", page_title="Board not found", page_message="This board is no longer shared or the link is invalid."), 404
     return render_template("shared.html", token=token)
@@ -135,23 +2018,16 @@ def register():
     if len(password) < 8:
         return jsonify({"error": "Password must be at least 8 characters"}), 400
 
-    password_hash = generate_password_hash(password)
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    password_hash = password_hasher.hash(password)
     try:
-        cur.execute(
-            "INSERT INTO users (email, password_hash) VALUES (%s, %s) RETURNING id, email",
-            (username, password_hash),
-        )
-        user = dict(cur.fetchone())
-        conn.commit()
+        with db_cursor() as cur:
+            cur.execute(
+                "INSERT INTO users (email, password_hash) VALUES (%s, %s) RETURNING id, email",
+                (username, password_hash),
+            )
+            user = dict(cur.fetchone())
     except psycopg2.IntegrityError:
-        conn.rollback()
-        cur.close()
-        conn.close()
         return jsonify({"error": "Username already taken"}), 409
-    cur.close()
-    conn.close()
 
     token = create_token(user["id"])
     return jsonify({"token": token, "username": user["email"]}), 201
@@ -164,16 +2040,24 @@ def login():
     password = data.get("password") or ""
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
+    # Shed the attempt before it costs a database round-trip.
+    password_hasher.pool.check_capacity()
 
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT id, email, password_hash FROM users WHERE email = %s", (username,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT id, email, password_hash FROM users WHERE email = %s", (username,))
+        user = cur.fetchone()
 
-    if not user or not check_password_hash(user["password_hash"], password):
+    if not user:
+        return jsonify({"error": "Invalid username or password"}), 401
+    ok, new_hash = password_hasher.verify(user["password_hash"], password)
+    if not ok:
         return jsonify({"error": "Invalid username or password"}), 401
+    if new_hash:
+        with db_cursor(cursor_factory=None) as cur:
+            cur.execute(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (new_hash, user["id"], user["password_hash"]),
+            )
 
     token = create_token(user["id"])
     return jsonify({"token": token, "username": user["email"]})
@@ -182,12 +2066,7 @@ def login():
 @app.route("/api/auth/me", methods=["GET"])
 @require_auth
 def get_me():
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute("SELECT id, email FROM users WHERE id = %s", (request.user_id,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
+    user = get_user(request.user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify({"id": user["id"], "username": user["email"]})
@@ -199,15 +2078,12 @@ def get_me():
 @app.route("/api/boards", methods=["GET"])
 @require_auth
 def list_boards():
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute(
-        "SELECT id, name, created_at FROM boards WHERE user_id = %s ORDER BY created_at DESC",
-        (request.user_id,),
-    )
-    boards = [dict(b) for b in cur.fetchall()]
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT id, name, created_at FROM boards WHERE user_id = %s ORDER BY created_at DESC",
+            (request.user_id,),
+        )
+        boards = [dict(b) for b in cur.fetchall()]
     return jsonify(boards)
 
 
@@ -218,64 +2094,39 @@ def create_board():
     name = (data.get("name") or "").strip()
     if not name:
         return jsonify({"error": "Name is required"}), 400
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute(
-        "INSERT INTO boards (name, user_id) VALUES (%s, %s) RETURNING id, name, created_at",
-        (name, request.user_id),
-    )
-    board = dict(cur.fetchone())
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute(
+            "INSERT INTO boards (name, user_id) VALUES (%s, %s) RETURNING id, name, created_at",
+            (name, request.user_id),
+        )
+        board = dict(cur.fetchone())
     return jsonify(board), 201
 
 
 @app.route("/api/boards/<int:board_id>", methods=["GET"])
 @require_auth
 def get_board(board_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute(
-        "SELECT id, name, share_token FROM boards WHERE id = %s AND user_id = %s",
-        (board_id, request.user_id),
-    )
-    board = cur.fetchone()
-    if not board:
-        cur.close()
-        conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        position_buffer.flush(board_id, cur)
+        response = board_snapshot_response(
+            cur, "owner", "b.id = %s AND b.user_id = %s", (board_id, request.user_id), OWNER_BOARD_FIELDS
+        )
+    if response is None:
         return jsonify({"error": "Board not found"}), 404
-    cur.execute(
-        "SELECT id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color FROM cards WHERE board_id = %s",
-        (board_id,),
-    )
-    cards = [dict(c) for c in cur.fetchall()]
-    cur.execute(
-        """
-        SELECT cn.id, cn.card_id_1, cn.card_id_2
-        FROM connections cn
-        JOIN cards c1 ON c1.id = cn.card_id_1
-        JOIN cards c2 ON c2.id = cn.card_id_2
-        WHERE c1.board_id = %s AND c2.board_id = %s
-        """,
-        (board_id, board_id),
-    )
-    connections = [dict(c) for c in cur.fetchall()]
-    cur.execute(
-        "SELECT id, content, pos_x, pos_y FROM notes WHERE board_id = %s",
-        (board_id,),
-    )
-    notes = [dict(n) for n in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify(
-        {
-            "board": dict(board),
-            "cards": cards,
-            "connections": connections,
-            "notes": notes,
-        }
-    )
+    return response
+
+
+@app.route("/api/boards/<int:board_id>/changes", methods=["GET"])
+@require_auth
+def get_board_changes(board_id):
+    with db_cursor(cursor_factory=None) as cur:
+        position_buffer.flush(board_id, cur)
+        response = board_changes_response(
+            cur, "b.id = %s AND b.user_id = %s", (board_id, request.user_id), OWNER_BOARD_FIELDS
+        )
+    if response is None:
+        return jsonify({"error": "Board not found"}), 404
+    return response
 
 
 @app.route("/api/boards/<int:board_id>", methods=["PATCH"])
@@ -285,16 +2136,12 @@ def rename_board(board_id):
     name = (data.get("name") or "").strip()
     if not name:
         return jsonify({"error": "Name is required"}), 400
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute(
-        "UPDATE boards SET name = %s WHERE id = %s AND user_id = %s RETURNING id, name",
-        (name, board_id, request.user_id),
-    )
-    board = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE boards SET name = %s WHERE id = %s AND user_id = %s RETURNING id, name",
+            (name, board_id, request.user_id),
+        )
+        board = cur.fetchone()
     if not board:
         return jsonify({"error": "Board not found"}), 404
     return jsonify(dict(board))
@@ -303,30 +2150,78 @@ def rename_board(board_id):
 @app.route("/api/boards/<int:board_id>", methods=["DELETE"])
 @require_auth
 def delete_board(board_id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM boards WHERE id = %s AND user_id = %s", (board_id, request.user_id)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(
+            "DELETE FROM boards WHERE id = %s AND user_id = %s", (board_id, request.user_id)
+        )
+    ownership_cache.forget_board(board_id)
     return jsonify({"success": True})
 
 
+# Copies every element of board %(source)s into board %(target)s in one
+# statement. Card ids are drawn from the sequence up front so connections can
+# be remapped without a round-trip per card; image files are shared, and the
+# uploads refcount trigger counts the new references.
+CLONE_BOARD_ELEMENTS = f"""
+    WITH card_ids AS MATERIALIZED (
+        SELECT id, nextval(pg_get_serial_sequence('cards', 'id')) AS new_id
+        FROM cards WHERE board_id = %(source)s
+    ),
+    copied_cards AS (
+        INSERT INTO cards (id, board_id, {", ".join(CARD_FIELDS[1:])})
+        SELECT m.new_id, %(target)s, {", ".join(f"c.{field}" for field in CARD_FIELDS[1:])}
+        FROM cards c JOIN card_ids m ON m.id = c.id
+        RETURNING 1
+    ),
+    copied_notes AS (
+        INSERT INTO notes (board_id, {", ".join(NOTE_FIELDS[1:])})
+        SELECT %(target)s, {", ".join(NOTE_FIELDS[1:])} FROM notes WHERE board_id = %(source)s
+        RETURNING 1
+    ),
+    copied_connections AS (
+        INSERT INTO connections (card_id_1, card_id_2, board_id)
+        SELECT LEAST(m1.new_id, m2.new_id), GREATEST(m1.new_id, m2.new_id), %(target)s
+        FROM connections cn
+        JOIN card_ids m1 ON m1.id = cn.card_id_1
+        JOIN card_ids m2 ON m2.id = cn.card_id_2
+        WHERE cn.board_id = %(source)s
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM copied_cards) AS cards,
+           (SELECT count(*) FROM copied_notes) AS notes,
+           (SELECT count(*) FROM copied_connections) AS connections
+"""
+
+
+@app.route("/api/boards/<int:board_id>/clone", methods=["POST"])
+@require_auth
+def clone_board(board_id):
+    data = request.get_json(silent=True) or {}
+    name = (data.get("name") or "").strip() or None
+    with db_cursor() as cur:
+        position_buffer.flush(board_id, cur)
+        cur.execute(
+            "INSERT INTO boards (name, user_id) "
+            "SELECT COALESCE(%s, name || ' (copy)'), user_id FROM boards WHERE id = %s AND user_id = %s "
+            "RETURNING id, name, created_at",
+            (name, board_id, request.user_id),
+        )
+        board = cur.fetchone()
+        if not board:
+            return jsonify({"error": "Board not found"}), 404
+        cur.execute(CLONE_BOARD_ELEMENTS, {"source": board_id, "target": board["id"]})
+        board = dict(board, **cur.fetchone())
+    return jsonify(board), 201
+
+
 # ---- Cards ----
 
 
 @app.route("/api/boards/<int:board_id>/cards", methods=["POST"])
 @require_auth
 def create_card(board_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not board_belongs_to_user(board_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Board not found"}), 404
-
+    # The body, image included, is received before a pool connection is
+    # taken; save_upload then only publishes the spooled file.
     title = (request.form.get("title") or "").strip()
     description = (request.form.get("description") or "").strip() or None
     pos_x = float(request.form.get("pos_x", 200))
@@ -338,57 +2233,47 @@ def create_card(board_id):
     color = request.form.get("color") or None
     if color and color not in ALLOWED_CARD_COLORS:
         color = None
+    upload = request.files.get("image")
 
     if not title:
-        cur.close()
-        conn.close()
         return jsonify({"error": "Title is required"}), 400
 
-    image_path = None
-    if "image" in request.files:
-        file = request.files["image"]
-        if file and file.filename:
-            ext = file.filename.rsplit(".", 1)[-1].lower()
-            if ext not in ("jpg", "jpeg", "png"):
-                cur.close()
-                conn.close()
-                return jsonify({"error": "Only jpg/png images are accepted"}), 400
-            filename = f"{uuid.uuid4().hex}.{ext}"
-            file.save(os.path.join(UPLOAD_FOLDER, filename))
-            image_path = f"/static/uploads/{filename}"
+    with db_cursor() as cur:
+        if board_id not in owned_board_ids(cur, "board", [board_id], request.user_id):
+            return jsonify({"error": "Board not found"}), 404
 
-    cur.execute(
-        """
-        INSERT INTO cards (board_id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        RETURNING id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color
-        """,
-        (board_id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color),
-    )
-    card = dict(cur.fetchone())
-    conn.commit()
-    cur.close()
-    conn.close()
+        image_path = None
+        if upload and upload.filename:
+            image_path = save_upload(upload.stream, cur)
+
+        cur.execute(
+            f"""
+            INSERT INTO cards (board_id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color)
+            SELECT id, %s, %s, %s, %s, %s, %s, %s, %s FROM boards WHERE id = %s AND user_id = %s
+            RETURNING {CARD_COLUMNS}
+            """,
+            (title, description, image_path, pos_x, pos_y, pin_position, inactive, color, board_id, request.user_id),
+        )
+        card = cur.fetchone()
+    if not card:
+        ownership_cache.forget_board(board_id)
+        return jsonify({"error": "Board not found"}), 404
+    card = dict(card)
+    if image_path:
+        image_processor.submit(card["id"], image_path)
     return jsonify(card), 201
 
 
 @app.route("/api/cards/<int:card_id>", methods=["PUT"])
 @require_auth
 def update_card(card_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not card_belongs_to_user(card_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Card not found"}), 404
-
     content_type = request.content_type or ""
+    data, upload = None, None
+    # As in create_card, the body is read before a connection is taken.
     if "multipart/form-data" in content_type:
         title = (request.form.get("title") or "").strip()
         description = (request.form.get("description") or "").strip() or None
         if not title:
-            cur.close()
-            conn.close()
             return jsonify({"error": "Title is required"}), 400
         fields = ["title = %s", "description = %s"]
         values = [title, description]
@@ -403,19 +2288,7 @@ def update_card(card_id):
             color = None
         fields.append("color = %s")
         values.append(color)
-        if "image" in request.files:
-            file = request.files["image"]
-            if file and file.filename:
-                ext = file.filename.rsplit(".", 1)[-1].lower()
-                if ext not in ("jpg", "jpeg", "png"):
-                    cur.close()
-                    conn.close()
-                    return jsonify({"error": "Only jpg/png images are accepted"}), 400
-                filename = f"{uuid.uuid4().hex}.{ext}"
-                file.save(os.path.join(UPLOAD_FOLDER, filename))
-                fields.append("image_path = %s")
-                values.append(f"/static/uploads/{filename}")
-        values.append(card_id)
+        upload = request.files.get("image")
     else:
         data = request.get_json()
         fields = []
@@ -425,36 +2298,41 @@ def update_card(card_id):
                 fields.append(f"{field} = %s")
                 values.append(data[field])
         if not fields:
-            cur.close()
-            conn.close()
             return jsonify({"error": "Nothing to update"}), 400
-        values.append(card_id)
 
-    cur.execute(
-        f"UPDATE cards SET {', '.join(fields)} WHERE id = %s "
-        "RETURNING id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color",
-        values,
-    )
-    card = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
-    return jsonify(dict(card))
+    with db_cursor() as cur:
+        if is_position_only(data):
+            return buffer_position_update("card", card_id, data, cur)
+        if upload and upload.filename:
+            fields.append("image_path = %s")
+            values.append(save_upload(upload.stream, cur))
+            fields.append("image_width = NULL, image_height = NULL, image_variants = NULL")
+
+        merge_pending_position(cur, "card", card_id, fields, values)
+        values += [card_id, request.user_id]
+        cur.execute(
+            f"UPDATE cards SET {', '.join(fields)} WHERE id = %s AND {OWNED_BY_USER} "
+            f"RETURNING {CARD_COLUMNS}",
+            values,
+        )
+        card = cur.fetchone()
+    if not card:
+        return jsonify({"error": "Card not found"}), 404
+    card = dict(card)
+    if card["image_path"] and card["image_variants"] is None:
+        image_processor.submit(card_id, card["image_path"])
+    return jsonify(card)
 
 
 @app.route("/api/cards/<int:card_id>", methods=["DELETE"])
 @require_auth
 def delete_card(card_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not card_belongs_to_user(card_id, request.user_id, cur):
-        cur.close()
-        conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(f"DELETE FROM cards WHERE id = %s AND {OWNED_BY_USER}", (card_id, request.user_id))
+        deleted = cur.rowcount
+    ownership_cache.pop(("card", card_id))
+    if not deleted:
         return jsonify({"error": "Card not found"}), 404
-    cur.execute("DELETE FROM cards WHERE id = %s", (card_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
     return jsonify({"success": True})
 
 
@@ -464,79 +2342,268 @@ def delete_card(card_id):
 @app.route("/api/boards/<int:board_id>/notes", methods=["POST"])
 @require_auth
 def create_note(board_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not board_belongs_to_user(board_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Board not found"}), 404
-
     data = request.get_json()
     content = (data.get("content") or "").strip()
     pos_x = float(data.get("pos_x", 200))
     pos_y = float(data.get("pos_y", 150))
-    cur.execute(
-        "INSERT INTO notes (board_id, content, pos_x, pos_y) VALUES (%s, %s, %s, %s) "
-        "RETURNING id, content, pos_x, pos_y",
-        (board_id, content, pos_x, pos_y),
-    )
-    note = dict(cur.fetchone())
-    conn.commit()
-    cur.close()
-    conn.close()
-    return jsonify(note), 201
+    with db_cursor() as cur:
+        cur.execute(
+            "INSERT INTO notes (board_id, content, pos_x, pos_y) "
+            "SELECT id, %s, %s, %s FROM boards WHERE id = %s AND user_id = %s "
+            "RETURNING id, content, pos_x, pos_y",
+            (content, pos_x, pos_y, board_id, request.user_id),
+        )
+        note = cur.fetchone()
+    if not note:
+        return jsonify({"error": "Board not found"}), 404
+    return jsonify(dict(note)), 201
 
 
 @app.route("/api/notes/<int:note_id>", methods=["PUT"])
 @require_auth
 def update_note(note_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not note_belongs_to_user(note_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Note not found"}), 404
-
     data = request.get_json()
-    fields = []
-    values = []
-    for field in ("content", "pos_x", "pos_y"):
-        if field in data:
-            fields.append(f"{field} = %s")
-            values.append(data[field])
-    if not fields:
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Niente da aggiornare"}), 400
-    values.append(note_id)
-    cur.execute(
-        f"UPDATE notes SET {', '.join(fields)} WHERE id = %s "
-        "RETURNING id, content, pos_x, pos_y",
-        values,
-    )
-    note = cur.fetchone()
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        if is_position_only(data):
+            return buffer_position_update("note", note_id, data, cur)
+        fields = []
+        values = []
+        for field in ("content", "pos_x", "pos_y"):
+            if field in data:
+                fields.append(f"{field} = %s")
+                values.append(data[field])
+        if not fields:
+            return jsonify({"error": "Niente da aggiornare"}), 400
+        merge_pending_position(cur, "note", note_id, fields, values)
+        values += [note_id, request.user_id]
+        cur.execute(
+            f"UPDATE notes SET {', '.join(fields)} WHERE id = %s AND {OWNED_BY_USER} "
+            "RETURNING id, content, pos_x, pos_y",
+            values,
+        )
+        note = cur.fetchone()
+    if not note:
+        return jsonify({"error": "Note not found"}), 404
     return jsonify(dict(note))
 
 
 @app.route("/api/notes/<int:note_id>", methods=["DELETE"])
 @require_auth
 def delete_note(note_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not note_belongs_to_user(note_id, request.user_id, cur):
-        cur.close()
-        conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(f"DELETE FROM notes WHERE id = %s AND {OWNED_BY_USER}", (note_id, request.user_id))
+        deleted = cur.rowcount
+    ownership_cache.pop(("note", note_id))
+    if not deleted:
         return jsonify({"error": "Note not found"}), 404
-    cur.execute("DELETE FROM notes WHERE id = %s", (note_id,))
-    conn.commit()
-    cur.close()
-    conn.close()
     return jsonify({"success": True})
 
 
+# ---- Positions ----
+
+
+@app.route("/api/boards/<int:board_id>/positions", methods=["PATCH"])
+@require_auth
+def update_positions(board_id):
+    data = request.get_json()
+    items = data.get("positions") if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Nothing to update"}), 400
+    positions = {kind: {} for kind in POSITION_TABLES}
+    for item in items:
+        try:
+            kind = item["kind"]
+            element_id = int(item["id"])
+            pos = (float(item["pos_x"]), float(item["pos_y"]))
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Each position needs kind, id, pos_x and pos_y"}), 400
+        if kind not in positions:
+            return jsonify({"error": "Kind must be card or note"}), 400
+        positions[kind][element_id] = pos
+
+    with db_cursor(cursor_factory=None) as cur:
+        if board_id not in owned_board_ids(cur, "board", [board_id], request.user_id):
+            return jsonify({"error": "Board not found"}), 404
+        if not position_buffer.enabled:
+            updated = {
+                kind: write_positions(cur, kind, board_id, kind_positions)
+                for kind, kind_positions in positions.items()
+            }
+            return jsonify({"updated": updated})
+    # Drags are coalesced; the flush only writes elements of this board.
+    for kind, kind_positions in positions.items():
+        position_buffer.add(board_id, kind, kind_positions)
+    return jsonify({"buffered": {kind: len(kind_positions) for kind, kind_positions in positions.items()}}), 202
+
+
+# ---- Layout ----
+
+
+@app.route("/api/boards/<int:board_id>/layout", methods=["POST"])
+@require_auth
+def layout_board(board_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        pinned = {int(card_id) for card_id in data.get("fixed") or ()}
+    except (TypeError, ValueError):
+        return jsonify({"error": "fixed must be a list of card ids"}), 400
+    layout_pool.check_capacity()
+
+    with db_cursor(cursor_factory=None) as cur:
+        if board_id not in owned_board_ids(cur, "board", [board_id], request.user_id):
+            return jsonify({"error": "Board not found"}), 404
+        position_buffer.flush(board_id, cur)
+        cur.execute(
+            "SELECT id, pos_x, pos_y, inactive FROM cards WHERE board_id = %s ORDER BY id", (board_id,)
+        )
+        cards = cur.fetchall()
+        cur.execute("SELECT card_id_1, card_id_2 FROM connections WHERE board_id = %s", (board_id,))
+        connections = cur.fetchall()
+    if not cards:
+        return jsonify({"updated": 0, "iterations": 0})
+
+    # The connection is released while the layout runs; inactive cards stay put.
+    ids = np.array([card[0] for card in cards])
+    positions = np.array([card[1:3] for card in cards], dtype=float)
+    fixed = np.array([card[3] or card[0] in pinned for card in cards])
+    edges = np.searchsorted(ids, np.array(connections, dtype=np.int64).reshape(-1, 2))
+    positions, iterations = layout_pool.run(
+        force_layout, positions, edges, fixed, LAYOUT_SPACING, LAYOUT_TIME_BUDGET, LAYOUT_ITERATIONS, board_id
+    )
+
+    moved = {
+        int(card_id): (round(float(x), 1), round(float(y), 1))
+        for card_id, (x, y), is_fixed in zip(ids, positions, fixed)
+        if not is_fixed
+    }
+    with db_cursor(cursor_factory=None) as cur:
+        position_buffer.discard("card", moved, board_id)
+        updated = write_positions(cur, "card", board_id, moved)
+    return jsonify({"updated": updated, "iterations": iterations})
+
+
+# ---- Graph ----
+
+
+def owned_board_graph(board_id):
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute("SELECT version FROM boards WHERE id = %s AND user_id = %s", (board_id, request.user_id))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return graph_cache.get(cur, board_id, row[0])
+
+
+@app.route("/api/boards/<int:board_id>/graph/path", methods=["GET"])
+@require_auth
+def graph_path(board_id):
+    source_id = request.args.get("from", type=int)
+    target_id = request.args.get("to", type=int)
+    if source_id is None or target_id is None:
+        return jsonify({"error": "from and to card ids are required"}), 400
+    graph = owned_board_graph(board_id)
+    if graph is None:
+        return jsonify({"error": "Board not found"}), 404
+    source, target = graph.node(source_id), graph.node(target_id)
+    if source is None or target is None:
+        return jsonify({"error": "Card not found"}), 404
+    path = graph.shortest_path(source, target)
+    return jsonify({"path": path, "hops": len(path) - 1 if path else None})
+
+
+@app.route("/api/boards/<int:board_id>/graph/components", methods=["GET"])
+@require_auth
+def graph_components(board_id):
+    graph = owned_board_graph(board_id)
+    if graph is None:
+        return jsonify({"error": "Board not found"}), 404
+    components = graph.components()
+    return jsonify({
+        "components": [component.tolist() for component in components],
+        "isolated": len(graph.ids) - sum(len(component) for component in components),
+    })
+
+
+@app.route("/api/boards/<int:board_id>/graph/centrality", methods=["GET"])
+@require_auth
+def graph_centrality(board_id):
+    limit = request.args.get("limit", 20, type=int)
+    graph = owned_board_graph(board_id)
+    if graph is None:
+        return jsonify({"error": "Board not found"}), 404
+    degree = graph.degree()
+    betweenness = run_blocking(graph.betweenness, GRAPH_BETWEENNESS_SAMPLES)
+    top = np.lexsort((-degree, -betweenness))[:max(limit, 0)]
+    return jsonify({
+        "cards": [
+            {"id": int(graph.ids[i]), "degree": int(degree[i]), "betweenness": round(float(betweenness[i]), 6)}
+            for i in top
+        ],
+        "exact": len(graph.ids) <= GRAPH_BETWEENNESS_SAMPLES,
+    })
+
+
+# ---- Search ----
+
+# Text matched per kind, and the column trigram matching runs on.
+SEARCH_SOURCES = {"card": ("cards", "title"), "note": ("notes", "content")}
+
+_trigram_search = None
+
+
+def trigram_search(cur):
+    """Whether pg_trgm is installed; checked once per process."""
+    global _trigram_search
+    if _trigram_search is None:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        _trigram_search = cur.fetchone() is not None
+    return _trigram_search
+
+
+def search_query(text):
+    # Every word must match as a prefix; anything but letters and digits is
+    # dropped, so the result is always a valid tsquery.
+    words = re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+    return " & ".join(f"{word}:*" for word in words)
+
+
+@app.route("/api/search", methods=["GET"])
+@require_auth
+def search():
+    text = request.args.get("q", "").strip()
+    tsquery = search_query(text)
+    if not tsquery:
+        return jsonify({"error": "q is required"}), 400
+    board_id = request.args.get("board_id", type=int)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), SEARCH_MAX_RESULTS)
+
+    with db_cursor() as cur:
+        fuzzy = trigram_search(cur)
+        selects = []
+        for kind, (table, column) in SEARCH_SOURCES.items():
+            # word_similarity scores typos and partial words; '<%' is the
+            # index-backed "has a similar word" test on the same column.
+            score = "ts_rank(e.search, query)"
+            match = "e.search @@ query"
+            if fuzzy:
+                score += f" + word_similarity(%(text)s, e.{column})"
+                match = f"({match} OR %(text)s <%% e.{column})"
+            selects.append(f"""
+                SELECT '{kind}' AS kind, e.id, e.board_id, b.name AS board_name,
+                       e.{column} AS text, e.pos_x, e.pos_y, {score} AS score
+                FROM {table} e JOIN boards b ON b.id = e.board_id, to_tsquery('simple', %(tsquery)s) query
+                WHERE b.user_id = %(user_id)s {"AND e.board_id = %(board_id)s" if board_id else ""} AND {match}
+            """)
+        cur.execute(
+            " UNION ALL ".join(selects) + " ORDER BY score DESC, kind, id LIMIT %(limit)s",
+            {"text": text, "tsquery": tsquery, "user_id": request.user_id, "board_id": board_id, "limit": limit},
+        )
+        hits = cur.fetchall()
+    for hit in hits:
+        hit["score"] = round(hit["score"], 4)
+    return jsonify({"results": hits, "fuzzy": fuzzy})
+
+
 # ---- Connections ----
 
 
@@ -551,31 +2618,22 @@ def create_connection():
     if id1 > id2:
         id1, id2 = id2, id1
 
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not card_belongs_to_user(id1, request.user_id, cur) or not card_belongs_to_user(
-        id2, request.user_id, cur
-    ):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Card not found"}), 404
-
     try:
-        cur.execute(
-            "INSERT INTO connections (card_id_1, card_id_2) VALUES (%s, %s) "
-            "RETURNING id, card_id_1, card_id_2",
-            (id1, id2),
-        )
-        connection = dict(cur.fetchone())
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify(connection), 201
+        with db_cursor() as cur:
+            # Both cards must be on one board the user owns.
+            cur.execute(
+                "INSERT INTO connections (card_id_1, card_id_2, board_id) SELECT c1.id, c2.id, b.id "
+                "FROM cards c1 JOIN cards c2 ON c2.board_id = c1.board_id JOIN boards b ON b.id = c1.board_id "
+                "WHERE c1.id = %s AND c2.id = %s AND b.user_id = %s "
+                "RETURNING id, card_id_1, card_id_2",
+                (id1, id2, request.user_id),
+            )
+            connection = cur.fetchone()
     except psycopg2.IntegrityError:
-        conn.rollback()
-        cur.close()
-        conn.close()
         return jsonify({"error": "Connection already exists"}), 409
+    if not connection:
+        return jsonify({"error": "Card not found"}), 404
+    return jsonify(dict(connection)), 201
 
 
 @app.route("/api/connections", methods=["DELETE"])
@@ -587,22 +2645,14 @@ def delete_connection():
     if id1 > id2:
         id1, id2 = id2, id1
 
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not card_belongs_to_user(id1, request.user_id, cur) or not card_belongs_to_user(
-        id2, request.user_id, cur
-    ):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Card not found"}), 404
-
-    cur.execute(
-        "DELETE FROM connections WHERE card_id_1 = %s AND card_id_2 = %s",
-        (id1, id2),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        boards = owned_board_ids(cur, "card", {id1, id2}, request.user_id)
+        if len(boards) != len({id1, id2}):
+            return jsonify({"error": "Card not found"}), 404
+        cur.execute(
+            "DELETE FROM connections WHERE card_id_1 = %s AND card_id_2 = %s AND board_id = %s",
+            (id1, id2, boards[id1]),
+        )
     return jsonify({"success": True})
 
 
@@ -612,20 +2662,14 @@ def delete_connection():
 @app.route("/api/boards/<int:board_id>/share", methods=["POST"])
 @require_auth
 def enable_share(board_id):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    if not board_belongs_to_user(board_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Board not found"}), 404
     token = secrets.token_urlsafe(24)
-    cur.execute(
-        "UPDATE boards SET share_token = %s WHERE id = %s RETURNING share_token",
-        (token, board_id),
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute(
+            "UPDATE boards SET share_token = %s WHERE id = %s AND user_id = %s RETURNING share_token",
+            (token, board_id, request.user_id),
+        )
+        if not cur.fetchone():
+            return jsonify({"error": "Board not found"}), 404
     return jsonify({"share_token": token, "share_url": f"/share/{token}"})
 
 
@@ -637,62 +2681,826 @@ def page_not_found(e):
 @app.route("/api/boards/<int:board_id>/share", methods=["DELETE"])
 @require_auth
 def disable_share(board_id):
-    conn = get_db()
-    cur = conn.cursor()
-    if not board_belongs_to_user(board_id, request.user_id, cur):
-        cur.close()
-        conn.close()
-        return jsonify({"error": "Board not found"}), 404
-    cur.execute(
-        "UPDATE boards SET share_token = NULL WHERE id = %s", (board_id,)
-    )
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(
+            "UPDATE boards SET share_token = NULL WHERE id = %s AND user_id = %s", (board_id, request.user_id)
+        )
+        if not cur.rowcount:
+            return jsonify({"error": "Board not found"}), 404
     return jsonify({"ok": True})
 
 
+def shared_board_id(cur, token):
+    # Viewers only flush the moves pending for the board they read.
+    cur.execute("SELECT id FROM boards WHERE share_token = %s", (token,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
 @app.route("/api/share/<token>", methods=["GET"])
 def get_shared_board(token):
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    cur.execute(
-        "SELECT id, name FROM boards WHERE share_token = %s", (token,)
-    )
-    board = cur.fetchone()
-    if not board:
-        cur.close()
-        conn.close()
+    with db_cursor(cursor_factory=None) as cur:
+        board_id = shared_board_id(cur, token)
+        if board_id is None:
+            return jsonify({"error": "Board not found"}), 404
+        position_buffer.flush(board_id, cur)
+        response = board_snapshot_response(
+            cur, "shared", "b.share_token = %s", (token,), SHARED_BOARD_FIELDS
+        )
+    if response is None:
         return jsonify({"error": "Board not found"}), 404
-    board_id = board["id"]
-    cur.execute(
-        "SELECT id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color FROM cards WHERE board_id = %s",
-        (board_id,),
+    return response
+
+
+@app.route("/api/share/<token>/changes", methods=["GET"])
+def get_shared_board_changes(token):
+    with db_cursor(cursor_factory=None) as cur:
+        board_id = shared_board_id(cur, token)
+        if board_id is None:
+            return jsonify({"error": "Board not found"}), 404
+        position_buffer.flush(board_id, cur)
+        response = board_changes_response(cur, "b.share_token = %s", (token,), SHARED_BOARD_FIELDS)
+    if response is None:
+        return jsonify({"error": "Board not found"}), 404
+    return response
+
+
+@app.route("/api/share/<token>/events", methods=["GET"])
+def get_shared_board_events(token):
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute("SELECT id, version FROM boards WHERE share_token = %s", (token,))
+        row = cur.fetchone()
+    if not row:
+        return jsonify({"error": "Board not found"}), 404
+    return board_event_stream(*row)
+
+
+# ---- History ----
+
+# Columns each kind of element is written back with; the rest are derived.
+HISTORY_COLUMNS = {
+    "cards": ("title", "description", "image_path", "pos_x", "pos_y", "pin_position", "inactive", "color"),
+    "notes": ("content", "pos_x", "pos_y"),
+    "connections": ("card_id_1", "card_id_2"),
+}
+# A card that gets another image again needs its variants rendered.
+HISTORY_CARD_VARIANTS = ", ".join(
+    f"{column} = CASE WHEN cards.image_path IS DISTINCT FROM EXCLUDED.image_path THEN NULL ELSE cards.{column} END"
+    for column in ("image_width", "image_height", "image_variants")
+)
+HISTORY_WRITES = {
+    table: f"""
+        INSERT INTO {table} (id, board_id, {", ".join(columns)})
+        SELECT r.id, %(board)s, {", ".join(f"r.{column}" for column in columns)}
+        FROM jsonb_populate_recordset(NULL::{table}, %(rows)s) r
+        ON CONFLICT (id) DO UPDATE
+        SET {", ".join(f"{column} = EXCLUDED.{column}" for column in columns)}
+            {", " + HISTORY_CARD_VARIANTS if table == "cards" else ""}
+        WHERE {table}.board_id = EXCLUDED.board_id
+    """
+    for table, columns in HISTORY_COLUMNS.items()
+}
+
+# The latest snapshot of board %(board)s at or before version %(at)s, or -1.
+HISTORY_BASE = """
+    SELECT COALESCE(max(version), -1) AS version FROM board_snapshots
+    WHERE board_id = %(board)s AND version <= %(at)s
+"""
+# Every element of board %(board)s as of version %(at)s: the snapshot below
+# it plus the events since, so the log is read from the snapshot on only.
+# Elements deleted by then come out with NULL data.
+HISTORY_STATE = f"""
+    WITH base AS ({HISTORY_BASE})
+    SELECT DISTINCT ON (kind, element_id) kind, element_id, data FROM (
+        SELECT s.version, s.kind, s.element_id, s.data FROM board_snapshots s, base
+        WHERE s.board_id = %(board)s AND s.version = base.version
+        UNION ALL
+        SELECT e.version, e.kind, e.element_id, e.data FROM board_events e, base
+        WHERE e.board_id = %(board)s AND e.version > base.version AND e.version <= %(at)s
+    ) history
+    ORDER BY kind, element_id, version DESC
+"""
+HISTORY_LIVE = """
+    SELECT 'boards' AS kind, id AS element_id, jsonb_build_object('name', name) AS data
+    FROM boards WHERE id = %(board)s
+    UNION ALL
+    SELECT 'cards', id, board_history_data(c) FROM cards c WHERE board_id = %(board)s
+    UNION ALL
+    SELECT 'notes', id, board_history_data(n) FROM notes n WHERE board_id = %(board)s
+    UNION ALL
+    SELECT 'connections', id, board_history_data(cn) FROM connections cn WHERE board_id = %(board)s
+"""
+# What has to be written for board %(board)s to look as it did at %(at)s.
+HISTORY_RESTORE = f"""
+    WITH target AS (SELECT * FROM ({HISTORY_STATE}) state WHERE data IS NOT NULL),
+    live AS ({HISTORY_LIVE})
+    SELECT COALESCE(t.kind, l.kind), COALESCE(t.element_id, l.element_id), t.data
+    FROM target t FULL JOIN live l ON l.kind = t.kind AND l.element_id = t.element_id
+    WHERE t.data IS DISTINCT FROM l.data
+"""
+# The elements changed by version %(change)s, each as it stood at version
+# %(at)s: one probe into the log and one into the snapshot per element, so
+# undo costs the same on a board of any age.
+HISTORY_CHANGE = f"""
+    WITH base AS ({HISTORY_BASE}),
+    touched AS (
+        SELECT DISTINCT kind, element_id FROM board_events
+        WHERE board_id = %(board)s AND version = %(change)s
     )
-    cards = [dict(c) for c in cur.fetchall()]
+    SELECT t.kind, t.element_id, CASE WHEN e.version > base.version THEN e.data ELSE s.data END
+    FROM touched t
+    CROSS JOIN base
+    LEFT JOIN LATERAL (
+        SELECT version, data FROM board_events
+        WHERE board_id = %(board)s AND kind = t.kind AND element_id = t.element_id AND version <= %(at)s
+        ORDER BY version DESC LIMIT 1
+    ) e ON true
+    LEFT JOIN board_snapshots s
+    ON s.board_id = %(board)s AND s.version = base.version AND s.kind = t.kind AND s.element_id = t.element_id
+"""
+
+
+def history_owner(cur, board_id, user_id, lock=False):
+    """``(version, live)`` of a board ``user_id`` owns or has deleted, else None."""
+    suffix = " FOR UPDATE" if lock else ""
+    cur.execute(f"SELECT version FROM boards WHERE id = %s AND user_id = %s{suffix}", (board_id, user_id))
+    row = cur.fetchone()
+    if row:
+        return row[0], True
+    cur.execute(f"SELECT version FROM board_trash WHERE board_id = %s AND user_id = %s{suffix}", (board_id, user_id))
+    row = cur.fetchone()
+    return (row[0], False) if row else None
+
+
+def history_start(cur, board_id):
+    # Older versions were compacted into the oldest snapshot kept.
+    cur.execute("SELECT COALESCE(min(version), 0) FROM board_snapshots WHERE board_id = %s", (board_id,))
+    return cur.fetchone()[0]
+
+
+def apply_history(cur, board_id, rows):
+    """Write ``(kind, element_id, data)`` states back to a board; None data deletes.
+
+    Images whose file is gone are dropped. Returns the cards whose image
+    variants have to be rendered.
+    """
+    removed, written = {}, {}
+    for kind, element_id, data in rows:
+        if data is None:
+            removed.setdefault(kind, []).append(element_id)
+        else:
+            written.setdefault(kind, []).append({**data, "id": element_id})
+    for table in ("connections", "notes", "cards"):
+        if table in removed:
+            cur.execute(f"DELETE FROM {table} WHERE board_id = %s AND id = ANY(%s)", (board_id, removed[table]))
+    for kind, table in POSITION_TABLES.items():
+        for element_id in removed.get(table, ()):
+            ownership_cache.pop((kind, element_id))
+    for board in written.get("boards", ()):
+        cur.execute("UPDATE boards SET name = %s WHERE id = %s", (board["name"], board_id))
+    cards = written.get("cards", ())
+    images = set(existing_uploads({card["image_path"] for card in cards if card.get("image_path")}))
+    for card in cards:
+        if card.get("image_path") not in images:
+            card["image_path"] = None
+    for kind, table in POSITION_TABLES.items():
+        position_buffer.discard(kind, [row["id"] for row in written.get(table, ())], board_id)
+    for table in HISTORY_COLUMNS:
+        if table in written:
+            cur.execute(HISTORY_WRITES[table], {"board": board_id, "rows": psycopg2.extras.Json(written[table])})
     cur.execute(
-        """
-        SELECT cn.id, cn.card_id_1, cn.card_id_2
-        FROM connections cn
-        JOIN cards c1 ON c1.id = cn.card_id_1
-        JOIN cards c2 ON c2.id = cn.card_id_2
-        WHERE c1.board_id = %s AND c2.board_id = %s
-        """,
-        (board_id, board_id),
+        "SELECT id, image_path FROM cards WHERE board_id = %s AND id = ANY(%s) "
+        "AND image_path IS NOT NULL AND image_variants IS NULL",
+        (board_id, [card["id"] for card in cards]),
     )
-    connections = [dict(c) for c in cur.fetchall()]
-    cur.execute(
-        "SELECT id, content, pos_x, pos_y FROM notes WHERE board_id = %s",
-        (board_id,),
+    return cur.fetchall()
+
+
+def history_response(cur, board_id, rows, **extra):
+    cur.execute("SELECT version FROM boards WHERE id = %s", (board_id,))
+    return {"id": board_id, "version": cur.fetchone()[0], "changed": len(rows), **extra}
+
+
+def step_history(board_id, undo):
+    # Pending moves are committed first, as their own version: sharing the
+    # replay's version would record two states of an element at once.
+    position_buffer.flush(board_id)
+    with db_cursor(cursor_factory=None) as cur:
+        owner = history_owner(cur, board_id, request.user_id, lock=True)
+        if not owner or not owner[1]:
+            return jsonify({"error": "Board not found"}), 404
+        cur.execute(
+            "SELECT version FROM board_undo WHERE board_id = %s AND undone = %s "
+            f"ORDER BY version {'DESC' if undo else 'ASC'} LIMIT 1",
+            (board_id, not undo),
+        )
+        row = cur.fetchone()
+        if row is None:
+            return jsonify({"error": f"Nothing to {'undo' if undo else 'redo'}"}), 409
+        change = row[0]
+        # Undo and redo are recorded like any change but do not enter the
+        # undo stack themselves.
+        cur.execute("SET LOCAL detectiveboard.history = 'replay'")
+        cur.execute(HISTORY_CHANGE, {"board": board_id, "change": change, "at": change - 1 if undo else change})
+        rows = cur.fetchall()
+        try:
+            pending = apply_history(cur, board_id, rows)
+        except psycopg2.IntegrityError:
+            return jsonify({"error": "The board has changed in a way that cannot be replayed"}), 409
+        cur.execute(
+            "UPDATE board_undo SET undone = %s WHERE board_id = %s AND version = %s", (undo, board_id, change)
+        )
+        result = history_response(cur, board_id, rows, **{"undone" if undo else "redone": change})
+    for card_id, image_path in pending:
+        image_processor.submit(card_id, image_path)
+    return jsonify(result)
+
+
+@app.route("/api/boards/<int:board_id>/undo", methods=["POST"])
+@require_auth
+def undo_board(board_id):
+    return step_history(board_id, undo=True)
+
+
+@app.route("/api/boards/<int:board_id>/redo", methods=["POST"])
+@require_auth
+def redo_board(board_id):
+    return step_history(board_id, undo=False)
+
+
+@app.route("/api/boards/<int:board_id>/restore", methods=["POST"])
+@require_auth
+def restore_board(board_id):
+    """Bring a board back to an earlier version, or a deleted board back to life."""
+    data = request.get_json(silent=True) or {}
+    version = data.get("version")
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+        return jsonify({"error": "version must be an integer"}), 400
+    # As in step_history, pending moves get a version of their own.
+    position_buffer.flush(board_id)
+    with db_cursor(cursor_factory=None) as cur:
+        owner = history_owner(cur, board_id, request.user_id, lock=True)
+        if not owner:
+            return jsonify({"error": "Board not found"}), 404
+        latest, live = owner
+        if live and version is None:
+            return jsonify({"error": "version is required"}), 400
+        version = latest if version is None else version
+        if not history_start(cur, board_id) <= version <= latest:
+            return jsonify({"error": "Version is not in the board's history"}), 400
+        if not live:
+            # A restored board keeps its id and carries on from its last
+            # version; bringing it back is not itself undoable.
+            cur.execute("SET LOCAL detectiveboard.history = 'replay'")
+            cur.execute(
+                "INSERT INTO boards (id, name, user_id, version) "
+                "SELECT board_id, name, user_id, version FROM board_trash WHERE board_id = %s",
+                (board_id,),
+            )
+            cur.execute("DELETE FROM board_trash WHERE board_id = %s", (board_id,))
+        cur.execute(HISTORY_RESTORE, {"board": board_id, "at": version})
+        rows = cur.fetchall()
+        pending = apply_history(cur, board_id, rows)
+        result = history_response(cur, board_id, rows, restored=version)
+    for card_id, image_path in pending:
+        image_processor.submit(card_id, image_path)
+    return jsonify(result)
+
+
+@app.route("/api/boards/<int:board_id>/history", methods=["GET"])
+@require_auth
+def get_board_history(board_id):
+    """Recorded versions, newest first; ``undone`` is null for undo/redo steps."""
+    before = request.args.get("before", type=int)
+    limit = min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), HISTORY_PAGE_SIZE)
+    with db_cursor(cursor_factory=None) as cur:
+        if not history_owner(cur, board_id, request.user_id):
+            return jsonify({"error": "Board not found"}), 404
+        cur.execute(
+            """
+            SELECT e.version, count(*), u.undone
+            FROM board_events e
+            LEFT JOIN board_undo u ON u.board_id = e.board_id AND u.version = e.version
+            WHERE e.board_id = %s AND e.version < %s
+            GROUP BY e.version, u.undone
+            ORDER BY e.version DESC
+            LIMIT %s
+            """,
+            (board_id, before if before is not None else 2**63 - 1, max(limit, 1)),
+        )
+        versions = [
+            {"version": version, "changes": changes, "undone": undone}
+            for version, changes, undone in cur.fetchall()
+        ]
+        start = history_start(cur, board_id)
+    return jsonify({"oldest": start, "versions": versions})
+
+
+@app.route("/api/boards/<int:board_id>/history/<int:version>", methods=["GET"])
+@require_auth
+def get_board_at_version(board_id, version):
+    """The board as it was at ``version``, for previewing a restore."""
+    with db_cursor(cursor_factory=None) as cur:
+        owner = history_owner(cur, board_id, request.user_id)
+        if not owner:
+            return jsonify({"error": "Board not found"}), 404
+        if not history_start(cur, board_id) <= version <= owner[0]:
+            return jsonify({"error": "Version is not in the board's history"}), 400
+        cur.execute(HISTORY_STATE, {"board": board_id, "at": version})
+        state = {"board": {"id": board_id, "version": version}, "cards": [], "notes": [], "connections": []}
+        for kind, element_id, data in cur.fetchall():
+            if data is None:
+                continue
+            if kind == "boards":
+                state["board"].update(data)
+            else:
+                state[kind].append({"id": element_id, **data})
+    return jsonify(state)
+
+
+@app.route("/api/boards/trash", methods=["GET"])
+@require_auth
+def get_board_trash():
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT board_id AS id, name, version, deleted_at FROM board_trash "
+            "WHERE user_id = %s ORDER BY deleted_at DESC",
+            (request.user_id,),
+        )
+        boards = cur.fetchall()
+    return jsonify(boards)
+
+
+# ---- Export / Import ----
+
+# Element kinds in archive order: connections refer to the cards before them.
+EXPORT_ELEMENTS = {
+    "card": ("cards", CARD_FIELDS),
+    "note": ("notes", NOTE_FIELDS),
+    "connection": ("connections", CONNECTION_FIELDS),
+}
+UPLOAD_PATH = re.compile(r"/static/uploads/[0-9a-f]{64}\.(?:jpg|png)")
+
+
+def spool_export(board_id, user_id):
+    """Write a board's NDJSON lines to a temp file: a header, then every card, note and connection.
+
+    Rows come through server-side cursors straight to disk, so memory stays
+    flat however large the board is, and the connection goes back to the pool
+    before the client reads anything. Returns the rewound file and the card
+    image paths, or None when the board is not the user's.
+    """
+    spool = tempfile.TemporaryFile()
+    images = set()
+    try:
+        with db_cursor(cursor_factory=None) as cur:
+            position_buffer.flush(board_id, cur)
+            cur.execute("SELECT name FROM boards WHERE id = %s AND user_id = %s", (board_id, user_id))
+            board = cur.fetchone()
+            if not board:
+                spool.close()
+                return None
+            header = {"type": "board", "format": EXPORT_FORMAT, "name": board[0]}
+            spool.write((json.dumps(header) + "\n").encode())
+            for kind, (table, fields) in EXPORT_ELEMENTS.items():
+                document = ", ".join(f"'{field}', {field}" for field in fields)
+                image = "image_path" if "image_path" in fields else "NULL"
+                with cur.connection.cursor(name=f"export_{table}") as rows:
+                    rows.itersize = EXPORT_BATCH_ROWS
+                    rows.execute(
+                        f"SELECT json_build_object('type', '{kind}', {document})::text, {image} "
+                        f"FROM {table} WHERE board_id = %s ORDER BY id",
+                        (board_id,),
+                    )
+                    for line, image_path in rows:
+                        if image_path:
+                            images.add(image_path)
+                        spool.write((line + "\n").encode())
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, images
+
+
+def export_lines(spool):
+    with spool:
+        yield from iter(lambda: spool.read(EXPORT_CHUNK_BYTES), b"")
+
+
+class ArchiveSink:
+    """Write-only target for a ZipFile; the bytes are handed out as they are produced."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def board_archive(spool, images):
+    # On an unseekable target ZipFile writes each member front to back with a
+    # trailing data descriptor, so nothing is buffered beyond one chunk.
+    sink = ArchiveSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("board.ndjson", "w", force_zip64=True) as member:
+            for chunk in export_lines(spool):
+                member.write(chunk)
+                if sink.size >= EXPORT_CHUNK_BYTES:
+                    yield sink.drain()
+        # Images are compressed already and are stored as they are.
+        for image_path in sorted(images):
+            filename = os.path.basename(image_path)
+            path = os.path.join(UPLOAD_FOLDER, filename)
+            if os.path.exists(path):
+                archive.write(path, f"images/{filename}", zipfile.ZIP_STORED)
+                yield sink.drain()
+    yield sink.drain()
+
+
+@app.route("/api/boards/<int:board_id>/export", methods=["GET"])
+@require_auth
+def export_board(board_id):
+    export = spool_export(board_id, request.user_id)
+    if export is None:
+        return jsonify({"error": "Board not found"}), 404
+    spool, images = export
+    if request.args.get("format") == "ndjson":
+        response = app.response_class(export_lines(spool), mimetype="application/x-ndjson")
+        filename = f"board-{board_id}.ndjson"
+    else:
+        response = app.response_class(board_archive(spool, images), mimetype="application/zip")
+        filename = f"board-{board_id}.zip"
+    # Also covers a client that leaves before the body is started.
+    response.call_on_close(spool.close)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ImportLines:
+    """File-like ``read()`` over the NDJSON lines of an import, for COPY FROM STDIN.
+
+    Every line must parse as a JSON object of a known type. JSON text cannot
+    hold raw control characters, so the bytes 0x01 and 0x02 are safe as the
+    CSV quote and delimiter and the lines are passed on unchanged.
+    """
+
+    KINDS = {"board", *EXPORT_ELEMENTS}
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._number = 0
+        self._buffer = b""
+        self._size = 0
+        self.error = None
+
+    def read(self, size=-1):
+        try:
+            return self._read(size)
+        except UploadRejected as e:
+            # psycopg2 turns exceptions raised here into a cancelled COPY.
+            self.error = e
+            raise
+
+    def _read(self, size):
+        parts, pending = [self._buffer], len(self._buffer)
+        while size < 0 or pending < size:
+            # Lines are read with a cap, so a member without newlines is
+            # rejected before it is held in memory whole.
+            line = self._stream.readline(IMPORT_MAX_LINE_BYTES + 1)
+            if not line:
+                break
+            self._number += 1
+            number = self._number
+            if len(line) > IMPORT_MAX_LINE_BYTES:
+                raise UploadRejected(
+                    f"Line {number} is longer than {IMPORT_MAX_LINE_BYTES // (1024 * 1024)} MB", 413
+                )
+            self._size += len(line)
+            if self._size > IMPORT_MAX_BYTES:
+                raise UploadRejected(f"Board data must be at most {IMPORT_MAX_BYTES // (1024 * 1024)} MB", 413)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                document = json.loads(line.decode())
+            except ValueError:
+                raise UploadRejected(f"Line {number} is not valid JSON")
+            if not isinstance(document, dict) or document.get("type") not in self.KINDS:
+                raise UploadRejected(f"Line {number} is not a board element")
+            parts.append(line + b"\n")
+            pending += len(line) + 1
+        data = b"".join(parts)
+        size = len(data) if size < 0 else size
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def import_image(archive, info, cur):
+    # Stored under the SHA-256 of the bytes actually received, like any
+    # upload; a card only keeps an image whose content matches its path.
+    stream = UploadStream()
+    try:
+        with archive.open(info) as member:
+            shutil.copyfileobj(member, stream)
+        save_upload(stream, cur)
+    except UploadRejected as e:
+        raise UploadRejected(f"{info.filename}: {e.message}", e.status)
+    finally:
+        stream.discard()
+
+
+# Inserts the staged import_rows into board %(target)s in one statement,
+# drawing card ids up front to remap connections, as CLONE_BOARD_ELEMENTS
+# does. Missing fields take the column defaults, and pin positions and colors
+# follow create_card's rules; image variants are rendered again afterwards.
+IMPORT_BOARD_ELEMENTS = """
+    WITH card_rows AS MATERIALIZED (
+        SELECT r.*, nextval(pg_get_serial_sequence('cards', 'id')) AS new_id
+        FROM import_rows i, jsonb_populate_record(NULL::cards, i.doc) r
+        WHERE i.doc->>'type' = 'card'
+    ),
+    imported_cards AS (
+        INSERT INTO cards (id, board_id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color)
+        SELECT new_id, %(target)s, title, description,
+               CASE WHEN image_path = ANY(%(images)s) THEN image_path END,
+               COALESCE(pos_x, 100), COALESCE(pos_y, 100),
+               CASE WHEN pin_position IN ('left', 'center', 'right') THEN pin_position ELSE 'center' END,
+               COALESCE(inactive, false), CASE WHEN color = ANY(%(colors)s) THEN color END
+        FROM card_rows
+        RETURNING 1
+    ),
+    imported_notes AS (
+        INSERT INTO notes (board_id, content, pos_x, pos_y)
+        SELECT %(target)s, COALESCE(r.content, ''), COALESCE(r.pos_x, 100), COALESCE(r.pos_y, 100)
+        FROM import_rows i, jsonb_populate_record(NULL::notes, i.doc) r
+        WHERE i.doc->>'type' = 'note'
+        RETURNING 1
+    ),
+    imported_connections AS (
+        INSERT INTO connections (card_id_1, card_id_2, board_id)
+        SELECT DISTINCT LEAST(m1.new_id, m2.new_id), GREATEST(m1.new_id, m2.new_id), %(target)s
+        FROM import_rows i, jsonb_populate_record(NULL::connections, i.doc) r
+        JOIN card_rows m1 ON m1.id = r.card_id_1
+        JOIN card_rows m2 ON m2.id = r.card_id_2
+        WHERE i.doc->>'type' = 'connection' AND m1.new_id <> m2.new_id
+        ON CONFLICT DO NOTHING
+        RETURNING 1
     )
-    notes = [dict(n) for n in cur.fetchall()]
-    cur.close()
-    conn.close()
-    return jsonify(
-        {
-            "board": dict(board),
-            "cards": cards,
-            "connections": connections,
-            "notes": notes,
-        }
+    SELECT (SELECT count(*) FROM imported_cards) AS cards,
+           (SELECT count(*) FROM imported_notes) AS notes,
+           (SELECT count(*) FROM imported_connections) AS connections
+"""
+
+
+def existing_uploads(paths):
+    return [path for path in paths if os.path.exists(os.path.join(UPLOAD_FOLDER, os.path.basename(path)))]
+
+
+@app.route("/api/boards/import", methods=["POST"])
+@require_auth
+def import_board():
+    """Create a board from an export: a zip archive or its bare NDJSON."""
+    request.max_content_length = IMPORT_MAX_BYTES
+    if request.mimetype not in ("application/zip", "application/x-ndjson"):
+        return jsonify({"error": "Send a board archive (application/zip) or NDJSON (application/x-ndjson)"}), 415
+    name = (request.args.get("name") or "").strip() or None
+
+    # The body is spooled and checked before a pool connection is taken, so
+    # slow clients do not hold one while they upload.
+    with tempfile.TemporaryFile() as spool:
+        shutil.copyfileobj(request.stream, spool, EXPORT_CHUNK_BYTES)
+        spool.seek(0)
+        members = []
+        if request.mimetype == "application/zip":
+            try:
+                archive = zipfile.ZipFile(spool)
+                members = [
+                    info for info in archive.infolist()
+                    if info.filename.startswith("images/") and not info.is_dir()
+                ]
+                lines = archive.open("board.ndjson")
+            except (zipfile.BadZipFile, KeyError):
+                raise UploadRejected("Not a board archive")
+        else:
+            lines = spool
+        with db_cursor() as cur:
+            for info in members:
+                import_image(archive, info, cur)
+            cur.execute("CREATE TEMP TABLE import_rows (doc jsonb) ON COMMIT DROP")
+            rows = ImportLines(lines)
+            try:
+                try:
+                    cur.copy_expert(
+                        "COPY import_rows (doc) FROM STDIN WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')",
+                        rows,
+                        EXPORT_CHUNK_BYTES,
+                    )
+                except psycopg2.extensions.QueryCanceledError:
+                    if rows.error:
+                        raise rows.error
+                    raise
+                cur.execute("SELECT doc FROM import_rows WHERE doc->>'type' = 'board' LIMIT 1")
+                header = (cur.fetchone() or {}).get("doc") or {}
+                if not isinstance(header.get("format", EXPORT_FORMAT), int) or header.get("format", EXPORT_FORMAT) > EXPORT_FORMAT:
+                    raise UploadRejected("Unsupported export format")
+                cur.execute(
+                    "SELECT DISTINCT doc->>'image_path' AS path FROM import_rows "
+                    "WHERE doc->>'type' = 'card' AND doc->>'image_path' IS NOT NULL"
+                )
+                images = existing_uploads(row["path"] for row in cur.fetchall() if UPLOAD_PATH.fullmatch(row["path"]))
+                # Lock the uploads rows as save_upload does, then look again: the
+                # GC may have removed a file just before.
+                cur.execute(
+                    "INSERT INTO uploads (path) SELECT unnest(%s::text[]) "
+                    "ON CONFLICT (path) DO UPDATE SET path = EXCLUDED.path",
+                    (images,),
+                )
+                images = existing_uploads(images)
+                cur.execute(
+                    "INSERT INTO boards (name, user_id) VALUES (%s, %s) RETURNING id, name, created_at",
+                    (name or str(header.get("name") or "").strip() or "Imported board", request.user_id),
+                )
+                board = dict(cur.fetchone())
+                cur.execute(
+                    IMPORT_BOARD_ELEMENTS,
+                    {"target": board["id"], "images": images, "colors": sorted(ALLOWED_CARD_COLORS)},
+                )
+                board.update(cur.fetchone())
+            except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+                raise UploadRejected(f"Invalid board data: {e.diag.message_primary}")
+            cur.execute("SELECT id, image_path FROM cards WHERE board_id = %s AND image_path IS NOT NULL", (board["id"],))
+            pending = cur.fetchall()
+    for card in pending:
+        image_processor.submit(card["id"], card["image_path"])
+    return jsonify(board), 201
+
+
+# ---- Commands ----
+
+
+@app.cli.command("process-images")
+def process_images():
+    """Render missing variants for every card image."""
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(
+            "SELECT id, image_path FROM cards "
+            "WHERE image_path IS NOT NULL AND image_variants IS NULL ORDER BY id"
+        )
+        pending = cur.fetchall()
+    failed = 0
+    for card_id, image_path in pending:
+        try:
+            image_processor.process(card_id, image_path)
+        except Exception as e:
+            failed += 1
+            click.echo(f"Card {card_id}: {e}", err=True)
+    click.echo(f"Processed {len(pending) - failed} images, {failed} failed")
+
+
+@app.cli.command("gc-uploads")
+@click.option("--batch-size", default=500, show_default=True)
+@click.option("--grace", default=UPLOAD_GC_GRACE, show_default=True, help="Seconds a file must be unreferenced.")
+@click.option("--dry-run", is_flag=True)
+def gc_uploads(batch_size, grace, dry_run):
+    """Delete uploaded files that no card, nor the history kept of one, references any more."""
+    files = reclaimed = 0
+    # Tracked uploads whose refcount dropped to zero, one locked batch at a time.
+    seen = set()
+    while True:
+        with db_cursor(cursor_factory=None) as cur:
+            cur.execute(
+                """
+                SELECT path FROM uploads
+                WHERE refcount = 0
+                  AND COALESCE(unreferenced_at, created_at) < now() - make_interval(secs => %s)
+                  AND NOT (path = ANY(%s))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM board_events e WHERE e.kind = 'cards' AND e.data->>'image_path' = uploads.path
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM board_snapshots s WHERE s.kind = 'cards' AND s.data->>'image_path' = uploads.path
+                  )
+                ORDER BY unreferenced_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                (grace, list(seen), batch_size),
+            )
+            paths = [path for (path,) in cur.fetchall()]
+            for path in paths:
+                for entry in upload_files(path):
+                    files += 1
+                    reclaimed += entry.stat().st_size
+                    if not dry_run:
+                        os.unlink(entry.path)
+            if dry_run:
+                seen.update(paths)
+            else:
+                cur.execute("DELETE FROM uploads WHERE path = ANY(%s)", (paths,))
+        if len(paths) < batch_size:
+            break
+
+    # Files no row knows about: uploads from before the table existed that
+    # were already replaced, and temp files left by interrupted requests.
+    cutoff = time.time() - grace
+    groups = {}
+    for entry in os.scandir(UPLOAD_FOLDER):
+        if entry.is_file():
+            # Temp files (".xxxx.tmp") all share the empty stem: each is its own group.
+            stem = entry.name if entry.name.startswith(".") else entry.name.split(".", 1)[0]
+            groups.setdefault(stem, []).append(entry)
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(
+            "SELECT path FROM uploads UNION SELECT image_path FROM cards WHERE image_path IS NOT NULL"
+        )
+        known = {os.path.basename(path).split(".", 1)[0] for (path,) in cur.fetchall()}
+    for stem, entries in groups.items():
+        if stem in known or any(entry.stat().st_mtime > cutoff for entry in entries):
+            continue
+        for entry in entries:
+            files += 1
+            reclaimed += entry.stat().st_size
+            if not dry_run:
+                os.unlink(entry.path)
+
+    verb = "Would reclaim" if dry_run else "Reclaimed"
+    click.echo(f"{verb} {reclaimed} bytes in {files} files")
+
+
+@app.cli.command("compact-history")
+@click.option(
+    "--snapshot-every", default=HISTORY_SNAPSHOT_EVENTS, show_default=True,
+    help="Events a board may log past its latest snapshot.",
+)
+@click.option("--retention", default=HISTORY_RETENTION_DAYS, show_default=True, help="Days of history to keep.")
+def compact_history(snapshot_every, retention):
+    """Snapshot boards with a long history tail and drop history past the retention period."""
+    with db_cursor(cursor_factory=None) as cur:
+        cur.execute(
+            """
+            SELECT b.id FROM boards b
+            CROSS JOIN LATERAL (
+                SELECT COALESCE(max(version), -1) AS version FROM board_snapshots WHERE board_id = b.id
+            ) s
+            WHERE (
+                SELECT count(*) FROM (
+                    SELECT 1 FROM board_events e WHERE e.board_id = b.id AND e.version > s.version LIMIT %s
+                ) tail
+            ) >= %s
+            """,
+            (snapshot_every, snapshot_every),
+        )
+        boards = [board_id for (board_id,) in cur.fetchall()]
+    # A board at a time, so each transaction stays short.
+    for board_id in boards:
+        with db_cursor(cursor_factory=None) as cur:
+            cur.execute("SELECT board_history_snapshot(%s)", ([board_id],))
+
+    with db_cursor(cursor_factory=None) as cur:
+        # Each board's newest snapshot from before the cutoff becomes the base
+        # its history is rebuilt from; whatever lies below it goes.
+        cur.execute(
+            """
+            CREATE TEMP TABLE history_base ON COMMIT DROP AS
+            SELECT board_id, max(version) AS version FROM board_snapshots
+            WHERE kind = 'boards' AND created_at < now() - make_interval(days => %s)
+            GROUP BY board_id
+            """,
+            (retention,),
+        )
+        cur.execute(
+            "DELETE FROM board_events e USING history_base h WHERE e.board_id = h.board_id AND e.version <= h.version"
+        )
+        events = cur.rowcount
+        cur.execute(
+            "DELETE FROM board_undo u USING history_base h WHERE u.board_id = h.board_id AND u.version <= h.version"
+        )
+        cur.execute(
+            "DELETE FROM board_snapshots s USING history_base h WHERE s.board_id = h.board_id AND s.version < h.version"
+        )
+        snapshot_rows = cur.rowcount
+        # Deleted boards are gone for good once they are past the period.
+        cur.execute(
+            "DELETE FROM board_trash WHERE deleted_at < now() - make_interval(days => %s) RETURNING board_id",
+            (retention,),
+        )
+        purged = [board_id for (board_id,) in cur.fetchall()]
+        for table in ("board_events", "board_snapshots", "board_undo"):
+            cur.execute(f"DELETE FROM {table} WHERE board_id = ANY(%s)", (purged,))
+    click.echo(
+        f"Snapshotted {len(boards)} boards; dropped {events} events, {snapshot_rows} snapshot rows "
+        f"and {len(purged)} deleted boards"
     )
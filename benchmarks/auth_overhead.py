@@ -0,0 +1,49 @@
+"""Per-request authentication overhead with and without the token/user caches.
+
+    DATABASE_NAME=bench python benchmarks/auth_overhead.py --yes --repeat 2000
+
+"require_auth" times the decorator alone around a no-op view; "GET /me" is a
+full request through the test client, including the user lookup.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    user_id, _ = populate(conn.cursor(), 10, 10)
+    conn.close()
+
+    token = app.create_token(user_id)
+    headers = {"Authorization": f"Bearer {token}"}
+    client = app.app.test_client()
+    view = app.require_auth(lambda: None)
+
+    def auth_only():
+        with app.app.test_request_context(headers=headers):
+            view()
+
+    rows = []
+    for cached in (False, True):
+        size = 10000 if cached else 0
+        for cache in (app.token_cache, app.user_cache):
+            cache.max_entries = size
+            cache.pop(user_id)
+        app.token_cache._entries.clear()
+        for name, fn in (
+            ("require_auth", auth_only),
+            ("GET /me", lambda: client.get("/api/auth/me", headers=headers)),
+        ):
+            result = measure(fn, args.repeat)
+            rows.append((name, "on" if cached else "off", f"{result['median'] * 1000:.0f}", f"{result['p95'] * 1000:.0f}"))
+    print_table(("path", "cache", "median us", "p95 us"), rows)
+
+
+if __name__ == "__main__":
+    main()
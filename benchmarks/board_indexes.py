@@ -0,0 +1,60 @@
+"""Board-load latency vs. total table size, with and without migration 008.
+
+    DATABASE_NAME=bench python benchmarks/board_indexes.py --yes --boards 200 2000 20000
+
+Every board has ``--cards`` cards, so the board being read stays the same size
+while the tables around it grow.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+INDEXES = {
+    "cards_board_id_idx": "CREATE INDEX cards_board_id_idx ON cards (board_id)",
+    "notes_board_id_idx": "CREATE INDEX notes_board_id_idx ON notes (board_id)",
+    "boards_user_id_created_at_idx": (
+        "CREATE INDEX boards_user_id_created_at_idx ON boards (user_id, created_at DESC)"
+    ),
+    "connections_card_id_2_idx": (
+        "CREATE INDEX connections_card_id_2_idx ON connections (card_id_2)"
+    ),
+}
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--boards", type=int, nargs="+", default=[200, 2000, 20000])
+    p.add_argument("--cards", type=int, default=50, help="cards per board")
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    client = app.app.test_client()
+    rows = []
+    for boards in args.boards:
+        user_id, share_token = populate(cur, boards, args.cards)
+        headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+        requests = {
+            "get_board": lambda: client.get("/api/boards/1", headers=headers),
+            "get_shared_board": lambda: client.get(f"/api/share/{share_token}"),
+            "list_boards": lambda: client.get("/api/boards", headers=headers),
+        }
+        for state in ("without", "with"):
+            for name, sql in INDEXES.items():
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+                if state == "with":
+                    cur.execute(sql)
+            cur.execute("ANALYZE")
+            for name, fn in requests.items():
+                assert fn().status_code == 200
+                result = measure(fn, args.repeat)
+                rows.append(
+                    (boards * args.cards, name, state, f"{result['median']:.2f}", f"{result['p95']:.2f}")
+                )
+    print_table(("total cards", "request", "indexes", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
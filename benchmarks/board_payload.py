@@ -0,0 +1,38 @@
+"""Board transfer size and server time per representation and encoding.
+
+    DATABASE_NAME=bench python benchmarks/board_payload.py --yes --cards 1000 5000
+
+Requests go through the Flask test client with the snapshot cache disabled,
+so every run includes the query, the encoding and the compression.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, nargs="+", default=[1000, 5000])
+    p.add_argument("--boards", type=int, default=20)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    client = app.app.test_client()
+    rows = []
+    for cards in args.cards:
+        _, share_token = populate(cur, args.boards, cards)
+        for fmt in ("rows", "columns"):
+            for encoding in ("identity", "gzip", "br"):
+                url = f"/api/share/{share_token}?format={fmt}"
+                headers = {"Accept-Encoding": encoding}
+                size = len(client.get(url, headers=headers).data)
+                result = measure(lambda: client.get(url, headers=headers), args.repeat)
+                rows.append((cards, fmt, encoding, size, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+    print_table(("cards", "format", "encoding", "bytes", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Board read cost: the former four-query loader vs. the json_agg snapshot.
+
+    DATABASE_NAME=bench python benchmarks/board_snapshot.py --yes --cards 10 1000 10000
+
+Both paths run inside a request context and include JSON encoding.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def legacy_get_board(app, board_id, user_id):
+    with app.db_cursor() as cur:
+        cur.execute(
+            "SELECT id, name, share_token FROM boards WHERE id = %s AND user_id = %s",
+            (board_id, user_id),
+        )
+        board = cur.fetchone()
+        cur.execute(
+            "SELECT id, title, description, image_path, pos_x, pos_y, pin_position, inactive, color FROM cards WHERE board_id = %s",
+            (board_id,),
+        )
+        cards = [dict(c) for c in cur.fetchall()]
+        cur.execute(
+            """
+            SELECT cn.id, cn.card_id_1, cn.card_id_2
+            FROM connections cn
+            JOIN cards c1 ON c1.id = cn.card_id_1
+            JOIN cards c2 ON c2.id = cn.card_id_2
+            WHERE c1.board_id = %s AND c2.board_id = %s
+            """,
+            (board_id, board_id),
+        )
+        connections = [dict(c) for c in cur.fetchall()]
+        cur.execute("SELECT id, content, pos_x, pos_y FROM notes WHERE board_id = %s", (board_id,))
+        notes = [dict(n) for n in cur.fetchall()]
+    return app.jsonify(
+        {"board": dict(board), "cards": cards, "connections": connections, "notes": notes}
+    ).get_data()
+
+
+def snapshot_get_board(app, board_id, user_id):
+    with app.db_cursor(cursor_factory=None) as cur:
+        _, _, snapshot = app.load_board_snapshot(
+            cur, "b.id = %s AND b.user_id = %s", (board_id, user_id), app.OWNER_BOARD_FIELDS
+        )
+    return app.app.response_class(snapshot, mimetype="application/json").get_data()
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, nargs="+", default=[10, 1000, 10000])
+    p.add_argument("--boards", type=int, default=20)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    rows = []
+    for cards in args.cards:
+        user_id, _ = populate(cur, args.boards, cards)
+        with app.app.test_request_context():
+            for name, fn in (("four queries", legacy_get_board), ("snapshot", snapshot_get_board)):
+                result = measure(lambda: fn(app, 1, user_id), args.repeat)
+                rows.append((cards, name, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+    print_table(("cards", "loader", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Board duplication: one clone request vs. replaying every element's create call.
+
+    DATABASE_NAME=bench python benchmarks/clone.py --yes --cards 5000 --repeat 5
+
+Board 1 is the template: ``--cards`` cards, each connected to the next, and
+``--notes`` notes. "replay" times ``--sample`` create requests of each kind
+through the test client and scales them to the board's element counts.
+"""
+
+import time
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=5000)
+    p.add_argument("--notes", type=int, default=500)
+    p.add_argument("--sample", type=int, default=200)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id, _ = populate(cur, 2, args.cards, notes_per_board=args.notes)
+    cur.execute(
+        "SELECT (SELECT count(*) FROM cards WHERE board_id = 1), (SELECT count(*) FROM notes WHERE board_id = 1), "
+        "(SELECT count(*) FROM connections WHERE board_id = 1)"
+    )
+    counts = cur.fetchone()
+    conn.close()
+
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+    clones = []
+
+    def clone():
+        clones.append(client.post("/api/boards/1/clone", headers=headers).json["id"])
+
+    result = measure(clone, args.repeat)
+    rows = [("clone", f"{result['median']:.1f}", f"{result['p95']:.1f}")]
+
+    target = clones[-1]
+    card_ids = []
+    start = time.perf_counter()
+    for i in range(args.sample):
+        card_ids.append(client.post(f"/api/boards/{target}/cards", data={"title": f"replay {i}"}, headers=headers).json["id"])
+    per_card = (time.perf_counter() - start) / args.sample
+    start = time.perf_counter()
+    for i in range(args.sample):
+        client.post(f"/api/boards/{target}/notes", json={"content": f"replay {i}"}, headers=headers)
+    per_note = (time.perf_counter() - start) / args.sample
+    start = time.perf_counter()
+    for a, b in zip(card_ids, card_ids[1:]):
+        client.post("/api/connections", json={"card_id_1": a, "card_id_2": b}, headers=headers)
+    per_connection = (time.perf_counter() - start) / (len(card_ids) - 1)
+    replay = (counts[0] * per_card + counts[1] * per_note + counts[2] * per_connection) * 1000
+    rows.append(("replay (estimated)", f"{replay:.0f}", "-"))
+
+    for board_id in clones:
+        client.delete(f"/api/boards/{board_id}", headers=headers)
+    print(f"board 1: {counts[0]} cards, {counts[1]} notes, {counts[2]} connections")
+    print_table(("path", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Shared helpers for the benchmark scripts.
+
+The scripts TRUNCATE the application tables: point DATABASE_NAME at a scratch
+database migrated with ``alembic upgrade head`` and pass ``--yes``.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import psycopg2  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv(os.path.join(ROOT, ".env"))
+# Measure the database path, not the in-process snapshot cache.
+os.environ.setdefault("SNAPSHOT_CACHE_BYTES", "0")
+
+
+def parser(description):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--yes", action="store_true", help="confirm the target database may be wiped")
+    p.add_argument("--repeat", type=int, default=50, help="timed runs per measurement")
+    return p
+
+
+def check_args(args):
+    if not args.yes:
+        sys.exit(
+            f"Refusing to wipe database {os.getenv('DATABASE_NAME', 'postgres')!r}: "
+            "run against a scratch database and pass --yes"
+        )
+
+
+def connect():
+    conn = psycopg2.connect(
+        host=os.getenv("DATABASE_HOST", "localhost"),
+        port=int(os.getenv("DATABASE_PORT", 5432)),
+        user=os.getenv("DATABASE_USER", "postgres"),
+        password=os.getenv("DATABASE_PASSWORD", "postgres"),
+        dbname=os.getenv("DATABASE_NAME", "postgres"),
+    )
+    conn.autocommit = True
+    return conn
+
+
+def populate(cur, boards, cards_per_board, notes_per_board=5, users=None, spread=5000):
+    """Fill the schema with ``boards`` boards owned by ``users`` users.
+
+    Cards are inserted round-robin across boards so a single board's rows are
+    scattered over the heap, like a real multi-tenant table. Each card is
+    connected to the next card of its board. Elements are placed at random
+    within a ``spread`` x ``spread`` square.
+    """
+    users = users or max(boards // 10, 1)
+    cards = boards * cards_per_board
+    # Bulk fill without the per-row version triggers.
+    cur.execute("SET session_replication_role = replica")
+    cur.execute("TRUNCATE users, boards, cards, notes, connections RESTART IDENTITY CASCADE")
+    cur.execute("TRUNCATE board_events, board_snapshots, board_undo, board_trash")
+    cur.execute(
+        "INSERT INTO users (email, password_hash) "
+        "SELECT 'bench' || g, 'x' FROM generate_series(1, %s) g",
+        (users,),
+    )
+    cur.execute(
+        "INSERT INTO boards (name, user_id, share_token) "
+        "SELECT 'board ' || g, 1 + g %% %s, CASE WHEN g %% 10 = 1 THEN md5(g::text) END "
+        "FROM generate_series(1, %s) g",
+        (users, boards),
+    )
+    cur.execute(
+        "INSERT INTO cards (board_id, title, description, pos_x, pos_y) "
+        "SELECT 1 + g %% %s, 'card ' || g, 'description of card ' || g, "
+        "random() * %s, random() * %s FROM generate_series(1, %s) g",
+        (boards, spread, spread, cards),
+    )
+    cur.execute(
+        "INSERT INTO connections (card_id_1, card_id_2, board_id) "
+        "SELECT g, g + %s, 1 + g %% %s FROM generate_series(1, %s) g",
+        (boards, boards, cards - boards),
+    )
+    cur.execute(
+        "INSERT INTO notes (board_id, content, pos_x, pos_y) "
+        "SELECT 1 + g %% %s, 'note ' || g, random() * %s, random() * %s "
+        "FROM generate_series(1, %s) g",
+        (boards, spread, spread, boards * notes_per_board),
+    )
+    cur.execute("SET session_replication_role = DEFAULT")
+    # History starts from a snapshot, as it does for boards that predate it.
+    cur.execute("SELECT board_history_snapshot(array_agg(id)) FROM boards")
+    cur.execute("ANALYZE")
+    cur.execute("SELECT user_id, share_token FROM boards WHERE id = 1")
+    return cur.fetchone()
+
+
+def measure(fn, repeat):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,73 @@
+"""Board connection lookup: the double JOIN through cards vs. connections.board_id.
+
+    DATABASE_NAME=bench python benchmarks/connection_query.py --yes --cards 10000 --connections 35000 --explain
+
+Board 1 gets ``--cards`` cards and about ``--connections`` random
+connections among the ``--boards`` boards' rows. Both queries return the
+same rows; "GET board" is the full owner load with the snapshot cache off.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+QUERIES = {
+    "join cards twice": (
+        "SELECT cn.id, cn.card_id_1, cn.card_id_2 FROM connections cn "
+        "JOIN cards c1 ON c1.id = cn.card_id_1 JOIN cards c2 ON c2.id = cn.card_id_2 "
+        "WHERE c1.board_id = 1 AND c2.board_id = 1"
+    ),
+    "board_id": "SELECT id, card_id_1, card_id_2 FROM connections WHERE board_id = 1",
+}
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=10000)
+    p.add_argument("--connections", type=int, default=35000)
+    p.add_argument("--boards", type=int, default=20)
+    p.add_argument("--explain", action="store_true", help="print each query plan")
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id, _ = populate(cur, args.boards, args.cards)
+    # populate() puts the card ids divisible by --boards on board 1.
+    cur.execute(
+        "INSERT INTO connections (card_id_1, card_id_2, board_id) "
+        "SELECT DISTINCT LEAST(a, b), GREATEST(a, b), 1 FROM ("
+        "  SELECT %s * (1 + floor(random() * %s)::int) AS a, %s * (1 + floor(random() * %s)::int) AS b "
+        "  FROM generate_series(1, %s)"
+        ") pairs WHERE a <> b ON CONFLICT DO NOTHING",
+        (args.boards, args.cards, args.boards, args.cards, args.connections - args.cards),
+    )
+    cur.execute("ANALYZE connections")
+    cur.execute("SELECT count(*) FROM connections WHERE board_id = 1")
+    edges = cur.fetchone()[0]
+
+    rows = []
+    for name, query in QUERIES.items():
+        if args.explain:
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}")
+            print(f"-- {name}\n" + "\n".join(row[0] for row in cur.fetchall()) + "\n")
+
+        def run():
+            cur.execute(query)
+            cur.fetchall()
+
+        result = measure(run, args.repeat)
+        rows.append((name, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+    conn.close()
+
+    app.snapshot_cache.max_bytes = 0
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+    result = measure(lambda: client.get("/api/boards/1", headers=headers), args.repeat)
+    rows.append(("GET board", f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+    print(f"board 1: {args.cards} cards, {edges} connections")
+    print_table(("query", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Board export and import: time, transfer size and Python heap peak.
+
+    DATABASE_NAME=bench python benchmarks/export_import.py --yes --cards 25000 --notes 1000 --repeat 3
+
+Board 1 holds ``--cards`` cards, each connected to the next, and ``--notes``
+notes. Exports are read chunk by chunk and dropped, as a client saving them
+would; imports post the export taken first. "peak MiB" is the tracemalloc
+peak of one extra, untimed run.
+"""
+
+import tracemalloc
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=25000)
+    p.add_argument("--notes", type=int, default=1000)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id, _ = populate(cur, 2, args.cards, notes_per_board=args.notes)
+    cur.execute(
+        "SELECT (SELECT count(*) FROM cards WHERE board_id = 1), (SELECT count(*) FROM notes WHERE board_id = 1), "
+        "(SELECT count(*) FROM connections WHERE board_id = 1)"
+    )
+    counts = cur.fetchone()
+    conn.close()
+
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+    imported = []
+
+    def export(query):
+        def run():
+            size = 0
+            for chunk in client.get(f"/api/boards/1/export{query}", headers=headers, buffered=False).response:
+                size += len(chunk)
+            return size
+        return run
+
+    def import_(body, mimetype):
+        def run():
+            response = client.post("/api/boards/import", data=body, content_type=mimetype, headers=headers)
+            imported.append(response.json["id"])
+        return run
+
+    def peak(fn):
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return f"{peak / 2**20:.1f}"
+
+    rows = []
+    for name, query, mimetype in (("zip", "", "application/zip"), ("ndjson", "?format=ndjson", "application/x-ndjson")):
+        body = client.get(f"/api/boards/1/export{query}", headers=headers).data
+        result = measure(export(query), args.repeat)
+        rows.append((f"export {name}", f"{result['median']:.0f}", f"{result['p95']:.0f}", len(body), peak(export(query))))
+        result = measure(import_(body, mimetype), args.repeat)
+        rows.append((f"import {name}", f"{result['median']:.0f}", f"{result['p95']:.0f}", len(body), peak(import_(body, mimetype))))
+
+    for board_id in imported:
+        client.delete(f"/api/boards/{board_id}", headers=headers)
+    print(f"board 1: {counts[0]} cards, {counts[1]} notes, {counts[2]} connections")
+    print_table(("path", "median ms", "p95 ms", "bytes", "peak MiB"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Graph query time on a large board, with and without the cached adjacency.
+
+    DATABASE_NAME=bench python benchmarks/graph.py --yes --cards 20000 --connections 60000
+
+Board 1 gets ``--cards`` cards and about ``--connections`` random
+connections. "reload" disables the graph cache so every request reads the
+whole board; "warm" answers from the cached graph; "after edit" adds and
+removes a connection before each request, so the graph is brought up to date
+from the board's changes first.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=20000)
+    p.add_argument("--connections", type=int, default=60000)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id, _ = populate(cur, 2, args.cards)
+    # populate() puts the even card ids on board 1.
+    cur.execute(
+        "INSERT INTO connections (card_id_1, card_id_2, board_id) "
+        "SELECT DISTINCT LEAST(a, b), GREATEST(a, b), 1 FROM ("
+        "  SELECT 2 + 2 * floor(random() * %s)::int AS a, 2 + 2 * floor(random() * %s)::int AS b "
+        "  FROM generate_series(1, %s)"
+        ") pairs WHERE a <> b ON CONFLICT DO NOTHING",
+        (args.cards, args.cards, args.connections - args.cards),
+    )
+    cur.execute("SELECT count(*) FROM connections WHERE board_id = 1")
+    edges = cur.fetchone()[0]
+    conn.close()
+
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+    queries = {
+        "path": f"/api/boards/1/graph/path?from=2&to={2 * args.cards}",
+        "components": "/api/boards/1/graph/components",
+        "centrality": "/api/boards/1/graph/centrality",
+    }
+    pair = {"card_id_1": 4, "card_id_2": 2 * args.cards - 2}
+
+    def edit():
+        client.post("/api/connections", json=pair, headers=headers)
+        client.delete("/api/connections", json=pair, headers=headers)
+
+    rows = []
+    for name, url in queries.items():
+        for state in ("reload", "warm", "after edit"):
+            app.graph_cache.max_boards = 0 if state == "reload" else app.GRAPH_CACHE_BOARDS
+            app.graph_cache._entries.clear()
+            client.get(url, headers=headers)
+            if state == "after edit":
+                def fn():
+                    edit()
+                    client.get(url, headers=headers)
+                edit_only = measure(edit, args.repeat)["median"]
+                result = measure(fn, args.repeat)
+                median = result["median"] - edit_only
+            else:
+                result = measure(lambda: client.get(url, headers=headers), args.repeat)
+                median = result["median"]
+            rows.append((name, state, f"{median:.2f}", f"{result['p95']:.2f}"))
+    print(f"board 1: {args.cards} cards, {edges} connections; {app.graph_cache.stats()}")
+    print_table(("query", "graph", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Board history: write overhead, and undo, view and restore cost as a board ages.
+
+    DATABASE_NAME=bench python benchmarks/history.py --yes --cards 5000 --ages 1000 10000 --repeat 20
+
+"write" rows time a bulk move of ``--moved`` cards and a card creation with
+the history triggers on and off. For each age, board 1 first goes through
+``age`` edits, each moving ``--moved`` random cards, with a snapshot every
+``--snapshot-every`` edits as ``flask compact-history`` would take them.
+"view" and "restore" target the version halfway back, once with those
+snapshots and once from the log alone.
+"""
+
+import random
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+HISTORY_TRIGGERS = [
+    (table, f"{table}_history_{event}")
+    for table in ("cards", "notes", "connections")
+    for event in ("insert", "update", "delete")
+]
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=5000)
+    p.add_argument("--moved", type=int, default=20)
+    p.add_argument("--ages", type=int, nargs="+", default=[1000, 10000])
+    p.add_argument("--snapshot-every", type=int, default=1000)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    user_id, _ = populate(cur, 2, args.cards)
+    cur.execute("SELECT array_agg(id) FROM cards WHERE board_id = 1")
+    card_ids = cur.fetchone()[0]
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+
+    rows = []
+    moves = [{"kind": "card", "id": card_id, "pos_x": 1.0, "pos_y": 2.0} for card_id in card_ids[: args.cards // 10]]
+    for enabled in (False, True):
+        for table, trigger in HISTORY_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} {'ENABLE' if enabled else 'DISABLE'} TRIGGER {trigger}")
+
+        def move():
+            for move in moves:
+                move["pos_x"] += 1
+            client.patch("/api/boards/1/positions", json={"positions": moves}, headers=headers)
+            app.position_buffer.flush(1)
+
+        label = "on" if enabled else "off"
+        result = measure(move, args.repeat)
+        rows.append((f"write: move {len(moves)} cards", label, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+        result = measure(lambda: client.post("/api/boards/1/cards", data={"title": "new"}, headers=headers), args.repeat)
+        rows.append(("write: create card", label, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+
+    for age in args.ages:
+        populate(cur, 2, args.cards)
+        cur.execute("SELECT array_agg(id) FROM cards WHERE board_id = 1")
+        card_ids = cur.fetchone()[0]
+        for i in range(1, age + 1):
+            cur.execute(
+                "UPDATE cards SET pos_x = pos_x + 1 WHERE id = ANY(%s)", (random.sample(card_ids, args.moved),)
+            )
+            if i % args.snapshot_every == 0:
+                cur.execute("SELECT board_history_snapshot(ARRAY[1])")
+        cur.execute("SELECT version FROM boards WHERE id = 1")
+        middle = cur.fetchone()[0] - age // 2
+        cur.execute("SELECT count(*) FROM board_events WHERE board_id = 1")
+        events = cur.fetchone()[0]
+
+        def view():
+            client.get(f"/api/boards/1/history/{middle}", headers=headers)
+
+        def restore():
+            client.post("/api/boards/1/restore", json={"version": middle}, headers=headers)
+
+        def undo_redo():
+            client.post("/api/boards/1/undo", headers=headers)
+            client.post("/api/boards/1/redo", headers=headers)
+
+        result = measure(undo_redo, args.repeat)
+        rows.append((f"undo + redo, {events} events", "-", f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+        for snapshots in (True, False):
+            if not snapshots:
+                cur.execute(
+                    "DELETE FROM board_snapshots WHERE board_id = 1 "
+                    "AND version > (SELECT min(version) FROM board_snapshots WHERE board_id = 1)"
+                )
+            label = "snapshots" if snapshots else "log only"
+            result = measure(view, args.repeat)
+            rows.append((f"view, {events} events", label, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+            result = measure(restore, args.repeat)
+            rows.append((f"restore, {events} events", label, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+
+    conn.close()
+    print(f"board 1: {args.cards} cards")
+    print_table(("operation", "history", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
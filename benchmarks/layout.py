@@ -0,0 +1,52 @@
+"""Auto-layout request time on a large board.
+
+    DATABASE_NAME=bench python benchmarks/layout.py --yes --cards 5000 --connections 20000 --repeat 3
+
+Board 1 gets ``--cards`` cards and about ``--connections`` random
+connections; every run lays the board out again from the previous result.
+"""
+
+import time
+
+from common import check_args, connect, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, nargs="+", default=[500, 5000])
+    p.add_argument("--connections", type=int, nargs="+", default=[2000, 20000])
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    client = app.app.test_client()
+    rows = []
+    for cards, connections in zip(args.cards, args.connections):
+        conn = connect()
+        cur = conn.cursor()
+        user_id, _ = populate(cur, 2, cards)
+        # populate() puts the even card ids on board 1.
+        cur.execute(
+            "INSERT INTO connections (card_id_1, card_id_2, board_id) "
+            "SELECT DISTINCT LEAST(a, b), GREATEST(a, b), 1 FROM ("
+            "  SELECT 2 + 2 * floor(random() * %s)::int AS a, 2 + 2 * floor(random() * %s)::int AS b "
+            "  FROM generate_series(1, %s)"
+            ") pairs WHERE a <> b ON CONFLICT DO NOTHING",
+            (cards, cards, connections - cards),
+        )
+        cur.execute("SELECT count(*) FROM connections WHERE board_id = 1")
+        edges = cur.fetchone()[0]
+        conn.close()
+
+        headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = client.post("/api/boards/1/layout", json={}, headers=headers).json
+            elapsed = (time.perf_counter() - start) * 1000
+            rows.append((cards, edges, result["updated"], result["iterations"], f"{elapsed:.0f}"))
+    print_table(("cards", "connections", "updated", "iterations", "request ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Board read throughput under many concurrent clients, per gunicorn worker class.
+
+    DATABASE_NAME=bench python benchmarks/load_test.py --yes --clients 500 --modes sync gthread gevent
+
+Each mode starts gunicorn with gunicorn.conf.py on a local port; "sync" is
+the former ``--workers 2`` setup. Clients keep their connection alive and
+fetch the shared board in a loop for ``--duration`` seconds, while
+``--listeners`` viewers hold the board's event stream open.
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+from common import ROOT, check_args, connect, parser, populate, print_table
+
+MODES = {
+    "sync": {"GUNICORN_WORKER_CLASS": "sync", "WEB_CONCURRENCY": "2"},
+    "gthread": {"GUNICORN_WORKER_CLASS": "gthread"},
+    "gevent": {"GUNICORN_WORKER_CLASS": "gevent"},
+}
+
+
+def start_server(mode, port, **overrides):
+    env = {**os.environ, **MODES[mode], **overrides, "PORT": str(port)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--access-logfile", os.devnull, "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    sys.exit(f"gunicorn ({mode}) did not start")
+
+
+async def fetch(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    status = await reader.readline()
+    if not status:
+        raise ConnectionError("connection closed")
+    length, close = 0, False
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    await reader.readexactly(length)
+    return int(status.split()[1]), close
+
+
+async def client(port, request, stop_at, latencies, errors, backoff=0):
+    conn = None
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        try:
+            if conn is None:
+                conn = await asyncio.open_connection("127.0.0.1", port)
+            status, close = await fetch(*conn, request)
+        except (OSError, asyncio.IncompleteReadError):
+            errors["connection"] = errors.get("connection", 0) + 1
+            conn = None
+            await asyncio.sleep(0.1)
+            continue
+        if close:
+            conn[1].close()
+            conn = None
+        if status == 200:
+            latencies.append((time.perf_counter() - start) * 1000)
+        else:
+            errors[status] = errors.get(status, 0) + 1
+            await asyncio.sleep(backoff)
+    if conn is not None:
+        conn[1].close()
+
+
+async def listener(port, path, stop_at):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    try:
+        while (remaining := stop_at - time.monotonic()) > 0:
+            try:
+                if not await asyncio.wait_for(reader.read(4096), remaining):
+                    break
+            except asyncio.TimeoutError:
+                break
+    finally:
+        writer.close()
+
+
+async def run_load(port, token, clients, listeners, duration):
+    request = f"GET /api/share/{token} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+    latencies, errors = [], {}
+    start = time.monotonic()
+    stop_at = start + duration
+    streams = [asyncio.create_task(listener(port, f"/api/share/{token}/events", stop_at)) for _ in range(listeners)]
+    await asyncio.sleep(0.5)
+    await asyncio.gather(*(client(port, request, stop_at, latencies, errors) for _ in range(clients)))
+    elapsed = time.monotonic() - start
+    await asyncio.gather(*streams, return_exceptions=True)
+    return latencies, errors, elapsed
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["sync", "gthread", "gevent"])
+    p.add_argument("--clients", type=int, default=500)
+    p.add_argument("--listeners", type=int, default=0, help="open event streams during the run")
+    p.add_argument("--duration", type=float, default=20)
+    p.add_argument("--cards", type=int, default=100)
+    p.add_argument("--port", type=int, default=8099)
+    args = p.parse_args()
+    check_args(args)
+
+    conn = connect()
+    _, share_token = populate(conn.cursor(), 20, args.cards)
+    conn.close()
+
+    rows = []
+    for mode in args.modes:
+        server = start_server(mode, args.port)
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                run_load(args.port, share_token, args.clients, args.listeners, args.duration)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else float("nan")
+        rows.append((
+            mode,
+            f"{len(latencies) / elapsed:.0f}",
+            f"{latencies[len(latencies) // 2]:.1f}" if latencies else "-",
+            f"{p99:.1f}",
+            ", ".join(f"{k}: {v}" for k, v in errors.items()) or "-",
+        ))
+    print_table(("mode", "req/s", "median ms", "p99 ms", "errors"), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Login throughput and board-read latency during a login storm.
+
+    DATABASE_NAME=bench python benchmarks/login_storm.py --yes --logins 200 --readers 20
+
+Each hashing setup starts gunicorn with gunicorn.conf.py; "inline" hashes on
+the request path like before, "pool" uses the password hasher's thread pool
+and its pending limit. ``--logins`` clients sign in in a loop while
+``--readers`` clients keep fetching the shared board. Like a client honouring
+Retry-After, a login client waits ``--backoff`` seconds after an error.
+"""
+
+import asyncio
+import json
+import time
+
+from common import check_args, connect, parser, populate, print_table
+from load_test import MODES, client, start_server
+
+PASSWORD = "benchmark-password"
+SETUPS = {
+    "inline": {"PASSWORD_HASH_WORKERS": "0"},
+    "pool": {},
+}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else float("nan")
+
+
+async def run_storm(port, share_token, logins, readers, duration, backoff):
+    body = json.dumps({"username": "bench1", "password": PASSWORD}).encode()
+    login = (
+        f"POST /api/auth/login HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+    read = f"GET /api/share/{share_token} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+    login_latencies, login_errors, read_latencies, read_errors = [], {}, [], {}
+    start = time.monotonic()
+    stop_at = start + duration
+    await asyncio.gather(
+        *(client(port, login, stop_at, login_latencies, login_errors, backoff) for _ in range(logins)),
+        *(client(port, read, stop_at, read_latencies, read_errors) for _ in range(readers)),
+    )
+    elapsed = time.monotonic() - start
+    return login_latencies, login_errors, read_latencies, read_errors, elapsed
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--setups", nargs="+", choices=sorted(SETUPS), default=["inline", "pool"])
+    p.add_argument("--mode", choices=sorted(MODES), default="gevent")
+    p.add_argument("--logins", type=int, default=200)
+    p.add_argument("--readers", type=int, default=20)
+    p.add_argument("--duration", type=float, default=20)
+    p.add_argument("--backoff", type=float, default=1, help="seconds a login client waits after an error")
+    p.add_argument("--port", type=int, default=8099)
+    args = p.parse_args()
+    check_args(args)
+
+    from werkzeug.security import generate_password_hash
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    _, share_token = populate(cur, 20, 100)
+    cur.execute(
+        "UPDATE users SET password_hash = %s WHERE email = 'bench1'",
+        (generate_password_hash(PASSWORD, method=app.PASSWORD_HASH_METHOD),),
+    )
+    conn.close()
+
+    rows = []
+    for setup in args.setups:
+        server = start_server(args.mode, args.port, **SETUPS[setup])
+        try:
+            login_latencies, login_errors, read_latencies, read_errors, elapsed = asyncio.run(
+                run_storm(args.port, share_token, args.logins, args.readers, args.duration, args.backoff)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        rows.append((
+            setup,
+            f"{len(login_latencies) / elapsed:.1f}",
+            f"{percentile(login_latencies, 0.99):.0f}",
+            ", ".join(f"{k}: {v}" for k, v in login_errors.items()) or "-",
+            f"{len(read_latencies) / elapsed:.0f}",
+            f"{percentile(read_latencies, 0.5):.1f}",
+            f"{percentile(read_latencies, 0.99):.1f}",
+            ", ".join(f"{k}: {v}" for k, v in read_errors.items()) or "-",
+        ))
+    print_table(
+        ("setup", "logins/s", "login p99 ms", "login errors", "reads/s", "read median ms", "read p99 ms", "read errors"),
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Search latency over the GIN-indexed search columns vs. an ILIKE scan.
+
+    DATABASE_NAME=bench python benchmarks/search.py --yes --boards 200 --cards 1000
+
+Every user owns ``--boards / 10`` boards. "ILIKE" is the query the endpoint
+would need without the indexes: a substring match over title, description
+and note content of the user's boards.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+ILIKE = """
+    SELECT 'card', e.id FROM cards e JOIN boards b ON b.id = e.board_id
+    WHERE b.user_id = %(user_id)s AND (e.title ILIKE %(pattern)s OR e.description ILIKE %(pattern)s)
+    UNION ALL
+    SELECT 'note', e.id FROM notes e JOIN boards b ON b.id = e.board_id
+    WHERE b.user_id = %(user_id)s AND e.content ILIKE %(pattern)s
+    LIMIT 20
+"""
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--boards", type=int, default=200)
+    p.add_argument("--cards", type=int, default=1000)
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    populate(cur, args.boards, args.cards)
+    cur.execute("UPDATE cards SET title = 'Moriarty hideout' WHERE id = 1 RETURNING board_id")
+    board_id = cur.fetchone()[0]
+    cur.execute("SELECT user_id FROM boards WHERE id = %s", (board_id,))
+    user_id = cur.fetchone()[0]
+    cur.execute("ANALYZE cards")
+
+    client = app.app.test_client()
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}"}
+    rows = []
+    for label, term in (("rare word", "moriarty"), ("common word", "card")):
+        for scope in ("all boards", "one board"):
+            url = f"/api/search?q={term}" + (f"&board_id={board_id}" if scope == "one board" else "")
+            hits = len(client.get(url, headers=headers).json["results"])
+            result = measure(lambda: client.get(url, headers=headers), args.repeat)
+            rows.append((label, scope, "search", hits, f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+        params = {"user_id": user_id, "pattern": f"%{term}%"}
+
+        def ilike():
+            cur.execute(ILIKE, params)
+            cur.fetchall()
+
+        result = measure(ilike, args.repeat)
+        rows.append((label, "all boards", "ILIKE query", "-", f"{result['median']:.2f}", f"{result['p95']:.2f}"))
+    conn.close()
+    print_table(("term", "scope", "path", "hits", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
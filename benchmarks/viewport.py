@@ -0,0 +1,49 @@
+"""Full board load vs. viewport (``?bbox=``) load on a very large board.
+
+    DATABASE_NAME=bench python benchmarks/viewport.py --yes --cards 50000 --spread 50000
+
+Board 1 gets ``--cards`` cards spread over a ``--spread`` square; each
+viewport is a 1920x1080 screen at the given zoom, centred on the board.
+"""
+
+from common import check_args, connect, measure, parser, populate, print_table
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--cards", type=int, default=50000)
+    p.add_argument("--spread", type=int, default=50000)
+    p.add_argument("--zooms", type=float, nargs="+", default=[1, 0.5, 0.15])
+    args = p.parse_args()
+    check_args(args)
+
+    import app
+
+    conn = connect()
+    cur = conn.cursor()
+    # Two boards, so the other board's rows share the table and the index.
+    user_id, _ = populate(cur, 2, args.cards, notes_per_board=args.cards // 10, spread=args.spread)
+    conn.close()
+
+    headers = {"Authorization": f"Bearer {app.create_token(user_id)}", "Accept-Encoding": "identity"}
+    client = app.app.test_client()
+    centre = args.spread / 2
+    urls = [("full board", "/api/boards/1?format=columns")]
+    for zoom in args.zooms:
+        half_w, half_h = 960 / zoom, 540 / zoom
+        bbox = f"{centre - half_w},{centre - half_h},{centre + half_w},{centre + half_h}"
+        urls.append((f"viewport zoom {zoom}", f"/api/boards/1?format=columns&bbox={bbox}"))
+    rows = []
+    for name, url in urls:
+        body = client.get(url, headers=headers).json
+        size = len(client.get(url, headers=headers).data)
+        result = measure(lambda: client.get(url, headers=headers), args.repeat)
+        rows.append((
+            name, len(body["cards"]["id"]), len(body["notes"]["id"]), len(body["connections"]["id"]),
+            size, f"{result['median']:.2f}", f"{result['p95']:.2f}",
+        ))
+    print_table(("request", "cards", "notes", "connections", "bytes", "median ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    main()
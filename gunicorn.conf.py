@@ -0,0 +1,34 @@
+"""Gunicorn settings, overridable through the environment.
+
+GUNICORN_WORKER_CLASS         gevent (default), gthread or sync
+WEB_CONCURRENCY               worker processes (default: 2 per CPU + 1, 1 per CPU for gevent)
+GUNICORN_THREADS              threads per gthread worker (default: 8)
+GUNICORN_WORKER_CONNECTIONS   concurrent clients per gevent worker (default: 1000)
+GUNICORN_TIMEOUT              seconds before a silent worker is restarted (default: 120)
+
+Moves are only buffered (POSITION_FLUSH_INTERVAL) with a single worker: the
+buffer lives in one process, and a read served by another would miss it.
+
+gevent workers serve event streams and slow uploads without tying up a
+worker each; CPU-heavy work must not run on the event loop. Each worker
+keeps its own database pool (DB_POOL_MAX_SIZE); requests beyond it wait
+up to DB_POOL_TIMEOUT for a connection and then get a 503.
+"""
+
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+workers = int(os.getenv("WEB_CONCURRENCY", cpus if worker_class == "gevent" else cpus * 2 + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+
+if workers > 1:
+    os.environ["POSITION_FLUSH_INTERVAL"] = "0"
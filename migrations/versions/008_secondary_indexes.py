@@ -0,0 +1,50 @@
+"""Add secondary indexes for board lookups
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "008"
+down_revision = "007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS cards_board_id_idx ON cards (board_id)
+        """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS notes_board_id_idx ON notes (board_id)
+        """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS boards_user_id_created_at_idx
+            ON boards (user_id, created_at DESC)
+        """)
+        # card_id_1 is already covered by UNIQUE (card_id_1, card_id_2).
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS connections_card_id_2_idx ON connections (card_id_2)
+        """)
+        # Most boards are never shared: index only the tokens that exist.
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS boards_share_token_idx
+            ON boards (share_token) WHERE share_token IS NOT NULL
+        """)
+    op.execute("ALTER TABLE boards DROP CONSTRAINT IF EXISTS boards_share_token_key")
+
+
+def downgrade() -> None:
+    op.execute("""
+        ALTER TABLE boards ADD CONSTRAINT boards_share_token_key UNIQUE (share_token)
+    """)
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS boards_share_token_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS connections_card_id_2_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS boards_user_id_created_at_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS notes_board_id_idx")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS cards_board_id_idx")
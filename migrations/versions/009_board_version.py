@@ -0,0 +1,95 @@
+"""Add a version counter to boards, bumped by every mutation
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "009"
+down_revision = "008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE boards ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0
+    """)
+    # Bumps a board's version at most once per transaction: the new value is
+    # remembered in a transaction-local setting and reused by later rows.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_next_version(bid INTEGER) RETURNS BIGINT AS $$
+        DECLARE
+            cached TEXT := current_setting('detectiveboard.board_version', true);
+            next_version BIGINT;
+        BEGIN
+            IF bid IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF cached LIKE bid || ':%' THEN
+                RETURN split_part(cached, ':', 2)::BIGINT;
+            END IF;
+            UPDATE boards SET version = version + 1 WHERE id = bid RETURNING version INTO next_version;
+            IF next_version IS NOT NULL THEN
+                PERFORM set_config('detectiveboard.board_version', bid || ':' || next_version, true);
+            END IF;
+            RETURN next_version;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_element_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            changed RECORD := CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        BEGIN
+            IF TG_TABLE_NAME = 'connections' THEN
+                PERFORM board_next_version(
+                    (SELECT board_id FROM cards WHERE id IN (changed.card_id_1, changed.card_id_2) LIMIT 1)
+                );
+            ELSE
+                PERFORM board_next_version(changed.board_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            cached TEXT := current_setting('detectiveboard.board_version', true);
+        BEGIN
+            IF cached LIKE NEW.id || ':%' THEN
+                NEW.version := split_part(cached, ':', 2)::BIGINT;
+            ELSE
+                NEW.version := OLD.version + 1;
+                PERFORM set_config('detectiveboard.board_version', NEW.id || ':' || NEW.version, true);
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_board_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION board_element_changed()
+        """)
+    op.execute("""
+        CREATE TRIGGER boards_bump_version
+        BEFORE UPDATE ON boards
+        FOR EACH ROW
+        WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.share_token IS DISTINCT FROM NEW.share_token)
+        EXECUTE FUNCTION board_changed()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS boards_bump_version ON boards")
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_bump_board_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS board_changed()")
+    op.execute("DROP FUNCTION IF EXISTS board_element_changed()")
+    op.execute("DROP FUNCTION IF EXISTS board_next_version(INTEGER)")
+    op.execute("ALTER TABLE boards DROP COLUMN IF EXISTS version")
@@ -0,0 +1,103 @@
+"""Track per-row versions and deletion tombstones for delta sync
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "010"
+down_revision = "009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0
+        """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS board_tombstones (
+            board_id INTEGER NOT NULL REFERENCES boards(id) ON DELETE CASCADE,
+            kind TEXT NOT NULL,
+            element_id INTEGER NOT NULL,
+            version BIGINT NOT NULL
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS board_tombstones_board_id_version_idx
+        ON board_tombstones (board_id, version)
+    """)
+    # Rows are stamped with the board version that last touched them; deleted
+    # rows leave a tombstone. A cascaded connection delete still finds its
+    # board through the surviving card; a board delete leaves nothing behind.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_element_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            changed RECORD := CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+            bid INTEGER;
+            next_version BIGINT;
+        BEGIN
+            IF TG_TABLE_NAME = 'connections' THEN
+                bid := (SELECT board_id FROM cards WHERE id IN (changed.card_id_1, changed.card_id_2) LIMIT 1);
+            ELSE
+                bid := changed.board_id;
+            END IF;
+            next_version := board_next_version(bid);
+            IF TG_OP = 'DELETE' THEN
+                IF next_version IS NOT NULL THEN
+                    INSERT INTO board_tombstones (board_id, kind, element_id, version)
+                    VALUES (bid, TG_TABLE_NAME, OLD.id, next_version);
+                END IF;
+                RETURN NULL;
+            END IF;
+            NEW.version := COALESCE(next_version, NEW.version);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_bump_board_version ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_stamp_version
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION board_element_changed()
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_tombstone
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION board_element_changed()
+        """)
+
+
+def downgrade() -> None:
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_tombstone ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_stamp_version ON {table}")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_element_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            changed RECORD := CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+        BEGIN
+            IF TG_TABLE_NAME = 'connections' THEN
+                PERFORM board_next_version(
+                    (SELECT board_id FROM cards WHERE id IN (changed.card_id_1, changed.card_id_2) LIMIT 1)
+                );
+            ELSE
+                PERFORM board_next_version(changed.board_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_board_version
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION board_element_changed()
+        """)
+    op.execute("DROP TABLE IF EXISTS board_tombstones")
+    for table in ("cards", "notes", "connections"):
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS version")
@@ -0,0 +1,79 @@
+"""Publish board version changes on the board_changes channel
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "011"
+down_revision = "010"
+branch_labels = None
+depends_on = None
+
+
+def _version_functions(notify: bool) -> None:
+    # NOTIFY is delivered on commit only, once per distinct payload.
+    board_notify = "PERFORM pg_notify('board_changes', bid || ':' || next_version);" if notify else ""
+    row_notify = "PERFORM pg_notify('board_changes', NEW.id || ':' || NEW.version);" if notify else ""
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION board_next_version(bid INTEGER) RETURNS BIGINT AS $$
+        DECLARE
+            cached TEXT := current_setting('detectiveboard.board_version', true);
+            next_version BIGINT;
+        BEGIN
+            IF bid IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF cached LIKE bid || ':%' THEN
+                RETURN split_part(cached, ':', 2)::BIGINT;
+            END IF;
+            UPDATE boards SET version = version + 1 WHERE id = bid RETURNING version INTO next_version;
+            IF next_version IS NOT NULL THEN
+                PERFORM set_config('detectiveboard.board_version', bid || ':' || next_version, true);
+                {board_notify}
+            END IF;
+            RETURN next_version;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION board_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            cached TEXT := current_setting('detectiveboard.board_version', true);
+        BEGIN
+            IF cached LIKE NEW.id || ':%' THEN
+                NEW.version := split_part(cached, ':', 2)::BIGINT;
+            ELSE
+                NEW.version := OLD.version + 1;
+                PERFORM set_config('detectiveboard.board_version', NEW.id || ':' || NEW.version, true);
+                {row_notify}
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def upgrade() -> None:
+    _version_functions(notify=True)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_deleted() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('board_changes', OLD.id || ':' || 'deleted');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER boards_notify_delete
+        AFTER DELETE ON boards
+        FOR EACH ROW EXECUTE FUNCTION board_deleted()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS boards_notify_delete ON boards")
+    op.execute("DROP FUNCTION IF EXISTS board_deleted()")
+    _version_functions(notify=False)
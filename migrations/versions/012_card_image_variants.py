@@ -0,0 +1,31 @@
+"""Add image dimensions and generated variants to cards
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "012"
+down_revision = "011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE cards
+            ADD COLUMN IF NOT EXISTS image_width INTEGER,
+            ADD COLUMN IF NOT EXISTS image_height INTEGER,
+            ADD COLUMN IF NOT EXISTS image_variants JSONB
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        ALTER TABLE cards
+            DROP COLUMN IF EXISTS image_variants,
+            DROP COLUMN IF EXISTS image_height,
+            DROP COLUMN IF EXISTS image_width
+    """)
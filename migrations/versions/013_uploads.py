@@ -0,0 +1,79 @@
+"""Track uploaded files with a reference count maintained from cards
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "013"
+down_revision = "012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            path TEXT PRIMARY KEY,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            unreferenced_at TIMESTAMPTZ
+        )
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS uploads_unreferenced_idx
+        ON uploads (unreferenced_at) WHERE refcount = 0
+    """)
+    op.execute("""
+        INSERT INTO uploads (path, refcount)
+        SELECT image_path, count(*) FROM cards WHERE image_path IS NOT NULL GROUP BY image_path
+        ON CONFLICT (path) DO NOTHING
+    """)
+    # Cascaded deletes (board -> cards) fire row triggers too, so every way a
+    # card stops pointing at a file is counted.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION card_image_refcount() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' AND OLD.image_path IS NOT NULL THEN
+                UPDATE uploads
+                SET refcount = refcount - 1,
+                    unreferenced_at = CASE WHEN refcount <= 1 THEN now() END
+                WHERE path = OLD.image_path;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.image_path IS NOT NULL THEN
+                INSERT INTO uploads (path, refcount) VALUES (NEW.image_path, 1)
+                ON CONFLICT (path) DO UPDATE SET refcount = uploads.refcount + 1, unreferenced_at = NULL;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER cards_image_refcount
+        AFTER INSERT OR DELETE ON cards
+        FOR EACH ROW EXECUTE FUNCTION card_image_refcount()
+    """)
+    op.execute("""
+        CREATE TRIGGER cards_image_refcount_update
+        AFTER UPDATE OF image_path ON cards
+        FOR EACH ROW
+        WHEN (OLD.image_path IS DISTINCT FROM NEW.image_path)
+        EXECUTE FUNCTION card_image_refcount()
+    """)
+    # Lets a card reuse the variants already rendered for the same file.
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS cards_image_path_idx
+            ON cards (image_path) WHERE image_path IS NOT NULL
+        """)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS cards_image_path_idx")
+    op.execute("DROP TRIGGER IF EXISTS cards_image_refcount_update ON cards")
+    op.execute("DROP TRIGGER IF EXISTS cards_image_refcount ON cards")
+    op.execute("DROP FUNCTION IF EXISTS card_image_refcount()")
+    op.execute("DROP TABLE IF EXISTS uploads")
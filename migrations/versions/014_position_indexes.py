@@ -0,0 +1,34 @@
+"""Index card and note positions per board for viewport queries
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "014"
+down_revision = "013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The (board_id, pos_x, pos_y) indexes also serve plain board_id lookups,
+    # so they replace the single-column ones rather than adding to them.
+    with op.get_context().autocommit_block():
+        for table in ("cards", "notes"):
+            op.execute(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_board_id_position_idx
+                ON {table} (board_id, pos_x, pos_y)
+            """)
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_board_id_idx")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in ("cards", "notes"):
+            op.execute(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_board_id_idx ON {table} (board_id)
+            """)
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_board_id_position_idx")
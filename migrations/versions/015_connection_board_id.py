@@ -0,0 +1,101 @@
+"""Store board_id on connections, tied to both cards' board
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "015"
+down_revision = "014"
+branch_labels = None
+depends_on = None
+
+
+def _element_changed(find_board: str) -> None:
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION board_element_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            changed RECORD := CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END;
+            bid INTEGER;
+            next_version BIGINT;
+        BEGIN
+            {find_board}
+            next_version := board_next_version(bid);
+            IF TG_OP = 'DELETE' THEN
+                IF next_version IS NOT NULL THEN
+                    INSERT INTO board_tombstones (board_id, kind, element_id, version)
+                    VALUES (bid, TG_TABLE_NAME, OLD.id, next_version);
+                END IF;
+                RETURN NULL;
+            END IF;
+            NEW.version := COALESCE(next_version, NEW.version);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE connections ADD COLUMN IF NOT EXISTS board_id INTEGER")
+    # Connections between cards of different boards were never shown on
+    # either board and cannot satisfy the new constraints.
+    op.execute("""
+        DELETE FROM connections cn USING cards c1, cards c2
+        WHERE c1.id = cn.card_id_1 AND c2.id = cn.card_id_2 AND c1.board_id <> c2.board_id
+    """)
+    # The backfill changes nothing clients can see, so rows keep their version.
+    op.execute("ALTER TABLE connections DISABLE TRIGGER connections_stamp_version")
+    op.execute("""
+        UPDATE connections cn SET board_id = c.board_id
+        FROM cards c WHERE c.id = cn.card_id_1 AND cn.board_id IS NULL
+    """)
+    op.execute("ALTER TABLE connections ENABLE TRIGGER connections_stamp_version")
+    op.execute("DELETE FROM connections WHERE board_id IS NULL")
+    op.execute("ALTER TABLE connections ALTER COLUMN board_id SET NOT NULL")
+
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS cards_id_board_id_key ON cards (id, board_id)
+        """)
+        # Serves whole-board loads and the version > since deltas alike.
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS connections_board_id_version_idx
+            ON connections (board_id, version)
+        """)
+    op.execute("""
+        ALTER TABLE cards ADD CONSTRAINT cards_id_board_id_key UNIQUE USING INDEX cards_id_board_id_key
+    """)
+    # Both cards must live on the connection's board; NOT VALID skips the
+    # full-table check under the exclusive lock, VALIDATE runs it afterwards.
+    for end in ("1", "2"):
+        op.execute(f"""
+            ALTER TABLE connections
+            ADD CONSTRAINT connections_card_{end}_board_fkey
+            FOREIGN KEY (card_id_{end}, board_id) REFERENCES cards (id, board_id) ON DELETE CASCADE
+            NOT VALID
+        """)
+        op.execute(f"ALTER TABLE connections VALIDATE CONSTRAINT connections_card_{end}_board_fkey")
+        op.execute(f"ALTER TABLE connections DROP CONSTRAINT IF EXISTS connections_card_id_{end}_fkey")
+    _element_changed("bid := changed.board_id;")
+
+
+def downgrade() -> None:
+    _element_changed("""
+            IF TG_TABLE_NAME = 'connections' THEN
+                bid := (SELECT board_id FROM cards WHERE id IN (changed.card_id_1, changed.card_id_2) LIMIT 1);
+            ELSE
+                bid := changed.board_id;
+            END IF;""")
+    for end in ("1", "2"):
+        op.execute(f"""
+            ALTER TABLE connections
+            ADD CONSTRAINT connections_card_id_{end}_fkey
+            FOREIGN KEY (card_id_{end}) REFERENCES cards (id) ON DELETE CASCADE
+        """)
+        op.execute(f"ALTER TABLE connections DROP CONSTRAINT IF EXISTS connections_card_{end}_board_fkey")
+    op.execute("ALTER TABLE cards DROP CONSTRAINT IF EXISTS cards_id_board_id_key")
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS connections_board_id_version_idx")
+    op.execute("ALTER TABLE connections DROP COLUMN IF EXISTS board_id")
@@ -0,0 +1,65 @@
+"""Index card and note text for full-text and fuzzy search
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "016"
+down_revision = "015"
+branch_labels = None
+depends_on = None
+
+# The 'simple' configuration lowercases without stemming, so names, places
+# and mixed-language notes match as typed; prefixes are matched at query time.
+SEARCH_VECTORS = {
+    "cards": "setweight(to_tsvector('simple', title), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')",
+    "notes": "to_tsvector('simple', content)",
+}
+TRIGRAM_COLUMNS = {"cards": "title", "notes": "content"}
+
+
+def upgrade() -> None:
+    # Generated columns are kept current by every INSERT and UPDATE.
+    for table, vector in SEARCH_VECTORS.items():
+        op.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search tsvector
+            GENERATED ALWAYS AS ({vector}) STORED
+        """)
+    # pg_trgm ships with the standard contrib packages; on servers without it
+    # search falls back to full-text matches only.
+    op.execute("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            END IF;
+        END
+        $$
+    """)
+    bind = op.get_bind()
+    trigrams = bind.exec_driver_sql("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").first()
+    with op.get_context().autocommit_block():
+        for table in SEARCH_VECTORS:
+            op.execute(f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_search_idx ON {table} USING gin (search)
+            """)
+        if trigrams:
+            for table, column in TRIGRAM_COLUMNS.items():
+                op.execute(f"""
+                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_{column}_trgm_idx
+                    ON {table} USING gin ({column} gin_trgm_ops)
+                """)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table, column in TRIGRAM_COLUMNS.items():
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_{column}_trgm_idx")
+        for table in SEARCH_VECTORS:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {table}_search_idx")
+    for table in SEARCH_VECTORS:
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search")
@@ -0,0 +1,240 @@
+"""Record an append-only history of board changes, with snapshots and undo
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+revision = "017"
+down_revision = "016"
+branch_labels = None
+depends_on = None
+
+# What an element's history records: the columns a user edits. Ids, versions
+# and what the image processor derives are left out; building the object
+# from named columns is several times cheaper than stripping to_jsonb(row).
+HISTORY_COLUMNS = {
+    "cards": ("title", "description", "image_path", "pos_x", "pos_y", "pin_position", "inactive", "color"),
+    "notes": ("content", "pos_x", "pos_y"),
+    "connections": ("card_id_1", "card_id_2"),
+}
+
+
+def _history_data(alias: str, columns: tuple[str, ...]) -> str:
+    return "jsonb_build_object(" + ", ".join(f"'{column}', {alias}.{column}" for column in columns) + ")"
+
+
+def upgrade() -> None:
+    # One row per element changed by a board version: the element as it was
+    # left by that version, or NULL once deleted. There is no foreign key to
+    # boards, so the history outlives a deleted board until it is compacted.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS board_events (
+            board_id INTEGER NOT NULL,
+            version BIGINT NOT NULL,
+            kind TEXT NOT NULL,
+            element_id INTEGER NOT NULL,
+            data JSONB
+        )
+    """)
+    # Every element of a board at one version, in the same shape as events;
+    # the 'boards' row is always present.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS board_snapshots (
+            board_id INTEGER NOT NULL,
+            version BIGINT NOT NULL,
+            kind TEXT NOT NULL,
+            element_id INTEGER NOT NULL,
+            data JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (board_id, version, kind, element_id)
+        )
+    """)
+    # The versions a user can undo (undone = false, newest first) and redo
+    # (undone = true, oldest first).
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS board_undo (
+            board_id INTEGER NOT NULL,
+            version BIGINT NOT NULL,
+            undone BOOLEAN NOT NULL DEFAULT false,
+            PRIMARY KEY (board_id, version)
+        )
+    """)
+    # No foreign key to users either: their boards are deleted by cascade,
+    # before the user row is gone.
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS board_trash (
+            board_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            version BIGINT NOT NULL,
+            deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS board_events_board_id_version_idx ON board_events (board_id, version)")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS board_events_element_idx ON board_events (board_id, kind, element_id, version)
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS board_snapshots_created_at_idx ON board_snapshots (created_at) WHERE kind = 'boards'
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS board_trash_user_id_idx ON board_trash (user_id, deleted_at)")
+    # Image files stay on disk while the history can still bring them back.
+    for table in ("board_events", "board_snapshots"):
+        op.execute(f"""
+            CREATE INDEX IF NOT EXISTS {table}_image_path_idx ON {table} ((data->>'image_path'))
+            WHERE kind = 'cards' AND data->>'image_path' IS NOT NULL
+        """)
+
+    # Overloaded on the row type, for snapshots and reads of the live board.
+    for table, columns in HISTORY_COLUMNS.items():
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION board_history_data(element {table}) RETURNS JSONB AS $$
+                SELECT {_history_data("element", columns)}
+            $$ LANGUAGE sql IMMUTABLE
+        """)
+    # One INSERT per statement. Rows deleted along with their board are not
+    # recorded, and neither are rows rewritten with the same content, like
+    # the image processor's. Transition table rows are anonymous records, so
+    # each table gets its own function with the columns spelled out.
+    for table, columns in HISTORY_COLUMNS.items():
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_history_record() RETURNS TRIGGER AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    INSERT INTO board_events (board_id, version, kind, element_id)
+                    SELECT o.board_id, v.version, '{table}', o.id
+                    FROM old_rows o
+                    JOIN boards b ON b.id = o.board_id
+                    CROSS JOIN LATERAL (SELECT board_next_version(o.board_id) AS version) v;
+                ELSIF TG_OP = 'INSERT' THEN
+                    INSERT INTO board_events (board_id, version, kind, element_id, data)
+                    SELECT n.board_id, n.version, '{table}', n.id, {_history_data("n", columns)}
+                    FROM new_rows n;
+                ELSE
+                    INSERT INTO board_events (board_id, version, kind, element_id, data)
+                    SELECT n.board_id, n.version, '{table}', n.id, {_history_data("n", columns)}
+                    FROM new_rows n JOIN old_rows o ON o.id = n.id
+                    WHERE ({", ".join(f"n.{c}" for c in columns)}) IS DISTINCT FROM ({", ".join(f"o.{c}" for c in columns)});
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_named() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO board_events (board_id, version, kind, element_id, data)
+            VALUES (NEW.id, NEW.version, 'boards', NEW.id, jsonb_build_object('name', NEW.name));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_trashed() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO board_trash (board_id, user_id, name, version)
+            VALUES (OLD.id, OLD.user_id, OLD.name, OLD.version)
+            ON CONFLICT (board_id) DO UPDATE
+            SET user_id = EXCLUDED.user_id, name = EXCLUDED.name, version = EXCLUDED.version, deleted_at = now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Every recorded version becomes undoable and drops what was undone
+    # before it, unless the transaction is itself replaying history. Version
+    # 0 is a board's creation, which is not undone.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_undo_push() RETURNS TRIGGER AS $$
+        BEGIN
+            IF current_setting('detectiveboard.history', true) = 'replay' THEN
+                RETURN NULL;
+            END IF;
+            WITH added AS (
+                INSERT INTO board_undo (board_id, version)
+                SELECT DISTINCT board_id, version FROM recorded WHERE version > 0
+                ON CONFLICT DO NOTHING
+                RETURNING board_id
+            )
+            DELETE FROM board_undo u USING added a WHERE u.board_id = a.board_id AND u.undone;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Snapshots are taken in one statement, so the rows match the version.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION board_history_snapshot(bids INTEGER[]) RETURNS VOID AS $$
+            INSERT INTO board_snapshots (board_id, version, kind, element_id, data)
+            SELECT b.id, b.version, 'boards', b.id, jsonb_build_object('name', b.name)
+            FROM boards b WHERE b.id = ANY(bids)
+            UNION ALL
+            SELECT b.id, b.version, 'cards', c.id, board_history_data(c)
+            FROM boards b JOIN cards c ON c.board_id = b.id WHERE b.id = ANY(bids)
+            UNION ALL
+            SELECT b.id, b.version, 'notes', n.id, board_history_data(n)
+            FROM boards b JOIN notes n ON n.board_id = b.id WHERE b.id = ANY(bids)
+            UNION ALL
+            SELECT b.id, b.version, 'connections', cn.id, board_history_data(cn)
+            FROM boards b JOIN connections cn ON cn.board_id = b.id WHERE b.id = ANY(bids)
+            ON CONFLICT DO NOTHING
+        $$ LANGUAGE sql
+    """)
+
+    for table in HISTORY_COLUMNS:
+        for event, transitions in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            op.execute(f"""
+                CREATE TRIGGER {table}_history_{event.lower()}
+                AFTER {event} ON {table}
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {table}_history_record()
+            """)
+    op.execute("""
+        CREATE TRIGGER boards_history_create
+        AFTER INSERT ON boards
+        FOR EACH ROW EXECUTE FUNCTION board_named()
+    """)
+    op.execute("""
+        CREATE TRIGGER boards_history_rename
+        AFTER UPDATE OF name ON boards
+        FOR EACH ROW
+        WHEN (OLD.name IS DISTINCT FROM NEW.name)
+        EXECUTE FUNCTION board_named()
+    """)
+    op.execute("""
+        CREATE TRIGGER boards_history_trash
+        AFTER DELETE ON boards
+        FOR EACH ROW EXECUTE FUNCTION board_trashed()
+    """)
+    op.execute("""
+        CREATE TRIGGER board_events_undo_push
+        AFTER INSERT ON board_events
+        REFERENCING NEW TABLE AS recorded
+        FOR EACH STATEMENT EXECUTE FUNCTION board_undo_push()
+    """)
+    # Existing boards start their history from a snapshot of today's state.
+    op.execute("SELECT board_history_snapshot(array_agg(id)) FROM boards")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS board_events_undo_push ON board_events")
+    op.execute("DROP TRIGGER IF EXISTS boards_history_trash ON boards")
+    op.execute("DROP TRIGGER IF EXISTS boards_history_rename ON boards")
+    op.execute("DROP TRIGGER IF EXISTS boards_history_create ON boards")
+    for table in HISTORY_COLUMNS:
+        for event in ("insert", "update", "delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_history_{event} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS board_history_snapshot(INTEGER[])")
+    op.execute("DROP FUNCTION IF EXISTS board_undo_push()")
+    op.execute("DROP FUNCTION IF EXISTS board_trashed()")
+    op.execute("DROP FUNCTION IF EXISTS board_named()")
+    for table in HISTORY_COLUMNS:
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_history_record()")
+        op.execute(f"DROP FUNCTION IF EXISTS board_history_data({table})")
+    for table in ("board_trash", "board_undo", "board_snapshots", "board_events"):
+        op.execute(f"DROP TABLE IF EXISTS {table}")
@@ -11,6 +11,9 @@ function getColorEntry(color) {
     return CARD_COLORS.find(c => c.value === (color || '')) || CARD_COLORS[0];
 }
 
+// Only these become a class name; anything else an import stored is ignored.
+const PIN_POSITIONS = ['left', 'center', 'right'];
+
 // ---- Auth state ----
 const TOKEN_KEY = 'db_token';
 let currentUser = null; // { id, username }
@@ -145,7 +148,7 @@ function handleUnauthorized() {
 // ---- Board state ----
 let currentBoardId = null;
 let currentBoardShareToken = null; // null = not shared
-let cards = [];        // [{id, title, description, image_path, pos_x, pos_y, el}]
+let cards = [];        // [{id, title, description, image_path, image_variants, pos_x, pos_y, el}]
 let notes = [];        // [{id, content, pos_x, pos_y, el}]
 let connections = [];  // [{id, card_id_1, card_id_2}]
 let selectedCardIds = new Set();
@@ -169,6 +172,11 @@ document.addEventListener('DOMContentLoaded', () => {
     document.getElementById('login-form').addEventListener('submit', handleLogin);
     document.getElementById('register-form').addEventListener('submit', handleRegister);
     document.getElementById('new-board-form').addEventListener('submit', onCreateBoard);
+    document.getElementById('search-form').addEventListener('submit', onSearch);
+    document.getElementById('import-board-btn').addEventListener('click', () => {
+        document.getElementById('import-board-file').click();
+    });
+    document.getElementById('import-board-file').addEventListener('change', onImportBoard);
     document.getElementById('card-form').addEventListener('submit', onCreateCard);
     document.getElementById('note-form').addEventListener('submit', onCreateNote);
     document.getElementById('edit-card-form').addEventListener('submit', onSaveEditCard);
@@ -368,6 +376,14 @@ document.addEventListener('DOMContentLoaded', () => {
             closeHelpModal();
             closeShareModal();
         }
+        const editing = e.target.closest('input, textarea, [contenteditable]');
+        if ((e.ctrlKey || e.metaKey) && currentBoardId && !editing) {
+            const key = e.key.toLowerCase();
+            if (key === 'z' || key === 'y') {
+                e.preventDefault();
+                stepHistory(key === 'y' || e.shiftKey ? 'redo' : 'undo');
+            }
+        }
     });
 });
 
@@ -386,6 +402,13 @@ function resetPan() {
     updateTransform();
 }
 
+function centerOn(el) {
+    const board = document.getElementById('board');
+    panX = board.clientWidth / 2 - (el.offsetLeft + el.offsetWidth / 2) * zoom;
+    panY = board.clientHeight / 2 - (el.offsetTop + el.offsetHeight / 2) * zoom;
+    updateTransform();
+}
+
 // ---- Menu ----
 
 function toggleMenu() {
@@ -416,6 +439,8 @@ function renderBoardsList(boardsData) {
         item.innerHTML = `
             <span class="board-item-name">${escHtml(b.name)}</span>
             <button class="board-rename-btn" title="Rename board">✎</button>
+            <button class="board-clone-btn" title="Duplicate board">&#10697;</button>
+            <button class="board-export-btn" title="Export board">&#10515;</button>
             <button class="board-delete-btn" title="Delete board">&times;</button>
         `;
         item.querySelector('.board-item-name').addEventListener('click', () => {
@@ -426,6 +451,14 @@ function renderBoardsList(boardsData) {
             e.stopPropagation();
             startRenameBoard(item, b);
         });
+        item.querySelector('.board-clone-btn').addEventListener('click', (e) => {
+            e.stopPropagation();
+            cloneBoard(b.id);
+        });
+        item.querySelector('.board-export-btn').addEventListener('click', (e) => {
+            e.stopPropagation();
+            exportBoard(b.id);
+        });
         item.querySelector('.board-delete-btn').addEventListener('click', (e) => {
             e.stopPropagation();
             deleteBoard(b.id, b.name);
@@ -499,6 +532,51 @@ function startRenameBoard(item, b) {
     input.addEventListener('blur', commit);
 }
 
+async function cloneBoard(boardId) {
+    const res = await fetch(`/api/boards/${boardId}/clone`, { method: 'POST', headers: authHeaders() });
+    if (res.status === 401) { handleUnauthorized(); return; }
+    if (!res.ok) return;
+    const board = await res.json();
+    document.getElementById('menu').classList.remove('open');
+    loadBoard(board.id);
+}
+
+// The archive is fetched with the auth header, then saved through a
+// temporary object URL.
+async function exportBoard(boardId) {
+    const res = await fetch(`/api/boards/${boardId}/export`, { headers: authHeaders() });
+    if (res.status === 401) { handleUnauthorized(); return; }
+    if (!res.ok) return;
+    const url = URL.createObjectURL(await res.blob());
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = `board-${boardId}.zip`;
+    link.click();
+    URL.revokeObjectURL(url);
+}
+
+async function onImportBoard(e) {
+    const file = e.target.files[0];
+    e.target.value = '';
+    if (!file) return;
+    const type = file.name.endsWith('.ndjson') ? 'application/x-ndjson' : 'application/zip';
+    const res = await fetch('/api/boards/import', {
+        method: 'POST',
+        headers: authHeaders({ 'Content-Type': type }),
+        body: file,
+    });
+    if (res.status === 401) { handleUnauthorized(); return; }
+    if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        alert(data.error || 'Import failed');
+        return;
+    }
+    const board = await res.json();
+    await loadBoards();
+    document.getElementById('menu').classList.remove('open');
+    loadBoard(board.id);
+}
+
 async function deleteBoard(boardId, boardName) {
     if (!confirm(`Delete board "${boardName}"?\nAll cards and connections will be lost.`)) return;
     const res = await fetch(`/api/boards/${boardId}`, {
@@ -519,11 +597,69 @@ async function deleteBoard(boardId, boardName) {
 
 // ---- Board loading ----
 
+// Boards are fetched with one array per field, which is smaller and faster
+// to parse than repeating every key on every row.
+function rowsFromColumns(columns) {
+    const fields = Object.keys(columns);
+    const length = fields.length ? columns[fields[0]].length : 0;
+    const rows = new Array(length);
+    for (let i = 0; i < length; i++) {
+        const row = {};
+        for (const field of fields) row[field] = columns[field][i];
+        rows[i] = row;
+    }
+    return rows;
+}
+
+function boardFromColumns(data) {
+    return {
+        ...data,
+        cards: rowsFromColumns(data.cards),
+        connections: rowsFromColumns(data.connections),
+        notes: rowsFromColumns(data.notes),
+    };
+}
+
+// ---- Search ----
+
+async function onSearch(e) {
+    e.preventDefault();
+    const q = document.getElementById('search-input').value.trim();
+    const list = document.getElementById('search-results');
+    if (!q) { list.innerHTML = ''; return; }
+    const res = await fetch(`/api/search?q=${encodeURIComponent(q)}`, { headers: authHeaders() });
+    if (res.status === 401) { handleUnauthorized(); return; }
+    if (!res.ok) return;
+    const { results } = await res.json();
+    list.innerHTML = results.length ? '' : '<p style="font-size:12px;opacity:0.5;padding:6px 0">No matches.</p>';
+    results.forEach(hit => {
+        const item = document.createElement('div');
+        item.className = 'search-hit';
+        item.innerHTML = `
+            <div class="search-hit-text">${hit.kind === 'note' ? '&#128203; ' : ''}${escHtml(hit.text)}</div>
+            <div class="search-hit-board">${escHtml(hit.board_name)}</div>
+        `;
+        item.addEventListener('click', () => jumpToHit(hit));
+        list.appendChild(item);
+    });
+}
+
+async function jumpToHit(hit) {
+    if (hit.board_id !== currentBoardId) await loadBoard(hit.board_id);
+    const item = (hit.kind === 'note' ? notes : cards).find(x => x.id === hit.id);
+    if (!item) return;
+    closeMenu();
+    centerOn(item.el);
+    deselectAll();
+    if (hit.kind === 'note') toggleNoteSelection(hit.id, false);
+    else toggleSelection(hit.id, false);
+}
+
 async function loadBoard(boardId) {
-    const res = await fetch(`/api/boards/${boardId}`, { headers: authHeaders() });
+    const res = await fetch(`/api/boards/${boardId}?format=columns`, { headers: authHeaders() });
     if (res.status === 401) { handleUnauthorized(); return; }
     if (!res.ok) return;
-    const data = await res.json();
+    const data = boardFromColumns(await res.json());
 
     currentBoardId = boardId;
     clearBoard();
@@ -566,6 +702,21 @@ function addCard(cardData) {
     return card;
 }
 
+// Variants are rendered in the background; until they exist the original is shown.
+// WebP is skipped on servers whose Pillow lacks it, so the <img> falls back too.
+function cardImageHtml(card) {
+    if (!card.image_path) return '';
+    const thumb = card.image_variants && card.image_variants.thumb;
+    if (!thumb) return `<img src="${card.image_path}" class="card-image" alt="">`;
+    const avif = thumb.avif ? `<source srcset="${thumb.avif}" type="image/avif">` : '';
+    return `<picture>${avif}<img src="${thumb.webp || card.image_path}" width="${thumb.width}" height="${thumb.height}" class="card-image" loading="lazy" alt=""></picture>`;
+}
+
+function cardFullImageUrl(card) {
+    const display = card.image_variants && card.image_variants.display;
+    return (display && display.webp) || card.image_path;
+}
+
 function createCardElement(card) {
     const el = document.createElement('div');
     el.className = 'card';
@@ -578,7 +729,7 @@ function createCardElement(card) {
     el.style.background = colorEntry.bg;
     if (colorEntry.dark) el.classList.add('card-dark');
 
-    const pinPos = card.pin_position || 'center';
+    const pinPos = PIN_POSITIONS.includes(card.pin_position) ? card.pin_position : 'center';
     const colorDotsHtml = CARD_COLORS.map(c => {
         const isActive = (card.color || '') === c.value;
         const extraStyle = c.value === '' ? 'box-shadow:inset 0 0 0 1px #c0a888;' : '';
@@ -591,7 +742,7 @@ function createCardElement(card) {
         <div class="card-content">
             <div class="card-title">${escHtml(card.title)}</div>
             ${card.description ? `<div class="card-description">${escHtml(card.description)}</div>` : ''}
-            ${card.image_path ? `<img src="${card.image_path}" class="card-image" alt="">` : ''}
+            ${cardImageHtml(card)}
         </div>
     `;
 
@@ -675,8 +826,7 @@ function makeDraggable(el, card) {
 
         const startX = downEvent.clientX;
         const startY = downEvent.clientY;
-        const startPosX = card.pos_x;
-        const startPosY = card.pos_y;
+        const group = dragGroup('card', card);
         let isDragging = false;
 
         function onMouseMove(e) {
@@ -686,11 +836,7 @@ function makeDraggable(el, card) {
                 isDragging = true;
             }
             if (isDragging) {
-                card.pos_x = startPosX + dx / zoom;
-                card.pos_y = startPosY + dy / zoom;
-                el.style.left = card.pos_x + 'px';
-                el.style.top = card.pos_y + 'px';
-                renderConnections();
+                moveGroup(group, dx / zoom, dy / zoom);
             }
         }
 
@@ -701,7 +847,7 @@ function makeDraggable(el, card) {
             if (!isDragging) {
                 toggleSelection(card.id, upEvent.shiftKey);
             } else {
-                saveCardPosition(card);
+                saveGroupPositions(group);
             }
         }
 
@@ -717,8 +863,7 @@ function makeDraggable(el, card) {
         const touch = downEvent.touches[0];
         const startX = touch.clientX;
         const startY = touch.clientY;
-        const startPosX = card.pos_x;
-        const startPosY = card.pos_y;
+        const group = dragGroup('card', card);
         let isDragging = false;
 
         function onTouchMove(e) {
@@ -730,11 +875,7 @@ function makeDraggable(el, card) {
                 isDragging = true;
             }
             if (isDragging) {
-                card.pos_x = startPosX + dx / zoom;
-                card.pos_y = startPosY + dy / zoom;
-                el.style.left = card.pos_x + 'px';
-                el.style.top = card.pos_y + 'px';
-                renderConnections();
+                moveGroup(group, dx / zoom, dy / zoom);
             }
         }
 
@@ -744,7 +885,7 @@ function makeDraggable(el, card) {
             if (!isDragging) {
                 toggleSelection(card.id, false);
             } else {
-                saveCardPosition(card);
+                saveGroupPositions(group);
             }
         }
 
@@ -895,6 +1036,31 @@ async function connectCards() {
     }
 }
 
+async function autoLayout() {
+    const btn = document.getElementById('layout-btn');
+    btn.disabled = true;
+    try {
+        const res = await fetch(`/api/boards/${currentBoardId}/layout`, {
+            method: 'POST',
+            headers: authHeaders({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({ fixed: [...selectedCardIds] }),
+        });
+        if (res.status === 401) { handleUnauthorized(); return; }
+        if (res.ok) await loadBoard(currentBoardId);
+    } finally {
+        btn.disabled = false;
+    }
+}
+
+async function stepHistory(direction) {
+    const res = await fetch(`/api/boards/${currentBoardId}/${direction}`, {
+        method: 'POST',
+        headers: authHeaders(),
+    });
+    if (res.status === 401) { handleUnauthorized(); return; }
+    if (res.ok) await loadBoard(currentBoardId);
+}
+
 async function disconnectCards() {
     const [id1, id2] = [...selectedCardIds];
     const res = await fetch('/api/connections', {
@@ -1118,15 +1284,6 @@ async function saveNoteContent(note) {
     if (res.status === 401) handleUnauthorized();
 }
 
-async function saveNotePosition(note) {
-    const res = await fetch(`/api/notes/${note.id}`, {
-        method: 'PUT',
-        headers: authHeaders({ 'Content-Type': 'application/json' }),
-        body: JSON.stringify({ pos_x: note.pos_x, pos_y: note.pos_y }),
-    });
-    if (res.status === 401) handleUnauthorized();
-}
-
 function makeNoteDraggable(el, note) {
     el.addEventListener('mousedown', (downEvent) => {
         if (downEvent.button !== 0) return;
@@ -1136,8 +1293,7 @@ function makeNoteDraggable(el, note) {
 
         const startX = downEvent.clientX;
         const startY = downEvent.clientY;
-        const startPosX = note.pos_x;
-        const startPosY = note.pos_y;
+        const group = dragGroup('note', note);
         let isDragging = false;
 
         function onMouseMove(e) {
@@ -1147,10 +1303,7 @@ function makeNoteDraggable(el, note) {
                 isDragging = true;
             }
             if (isDragging) {
-                note.pos_x = startPosX + dx / zoom;
-                note.pos_y = startPosY + dy / zoom;
-                el.style.left = note.pos_x + 'px';
-                el.style.top = note.pos_y + 'px';
+                moveGroup(group, dx / zoom, dy / zoom);
             }
         }
 
@@ -1160,7 +1313,7 @@ function makeNoteDraggable(el, note) {
             if (!isDragging) {
                 toggleNoteSelection(note.id, upEvent.shiftKey);
             } else {
-                saveNotePosition(note);
+                saveGroupPositions(group);
             }
         }
 
@@ -1177,8 +1330,7 @@ function makeNoteDraggable(el, note) {
         const touch = downEvent.touches[0];
         const startX = touch.clientX;
         const startY = touch.clientY;
-        const startPosX = note.pos_x;
-        const startPosY = note.pos_y;
+        const group = dragGroup('note', note);
         let isDragging = false;
 
         function onTouchMove(e) {
@@ -1190,10 +1342,7 @@ function makeNoteDraggable(el, note) {
                 isDragging = true;
             }
             if (isDragging) {
-                note.pos_x = startPosX + dx / zoom;
-                note.pos_y = startPosY + dy / zoom;
-                el.style.left = note.pos_x + 'px';
-                el.style.top = note.pos_y + 'px';
+                moveGroup(group, dx / zoom, dy / zoom);
             }
         }
 
@@ -1203,7 +1352,7 @@ function makeNoteDraggable(el, note) {
             if (!isDragging) {
                 toggleNoteSelection(note.id, false);
             } else {
-                saveNotePosition(note);
+                saveGroupPositions(group);
             }
         }
 
@@ -1258,13 +1407,41 @@ async function onCreateNote(e) {
     }
 }
 
-// ---- Save card position ----
+// ---- Save positions ----
 
-async function saveCardPosition(card) {
-    const res = await fetch(`/api/cards/${card.id}`, {
-        method: 'PUT',
+// Dragging a selected element moves the whole selection with it.
+function dragGroup(kind, item) {
+    const selected = kind === 'card' ? selectedCardIds : selectedNoteIds;
+    if (!selected.has(item.id)) {
+        return [{ kind, item, startX: item.pos_x, startY: item.pos_y }];
+    }
+    return [
+        ...cards.filter(c => selectedCardIds.has(c.id)).map(c => ({ kind: 'card', item: c, startX: c.pos_x, startY: c.pos_y })),
+        ...notes.filter(n => selectedNoteIds.has(n.id)).map(n => ({ kind: 'note', item: n, startX: n.pos_x, startY: n.pos_y })),
+    ];
+}
+
+function moveGroup(group, dx, dy) {
+    group.forEach(({ item, startX, startY }) => {
+        item.pos_x = startX + dx;
+        item.pos_y = startY + dy;
+        item.el.style.left = item.pos_x + 'px';
+        item.el.style.top = item.pos_y + 'px';
+    });
+    if (group.some(g => g.kind === 'card')) renderConnections();
+}
+
+function saveGroupPositions(group) {
+    return savePositions(group.map(({ kind, item }) => ({
+        kind, id: item.id, pos_x: item.pos_x, pos_y: item.pos_y,
+    })));
+}
+
+async function savePositions(positions) {
+    const res = await fetch(`/api/boards/${currentBoardId}/positions`, {
+        method: 'PATCH',
         headers: authHeaders({ 'Content-Type': 'application/json' }),
-        body: JSON.stringify({ pos_x: card.pos_x, pos_y: card.pos_y }),
+        body: JSON.stringify({ positions }),
     });
     if (res.status === 401) handleUnauthorized();
 }
@@ -1297,7 +1474,9 @@ function openEditPanel(card) {
     const imgWrap = document.getElementById('edit-current-image-wrap');
     const img = document.getElementById('edit-current-image');
     if (card.image_path) {
-        img.src = card.image_path;
+        const thumb = card.image_variants && card.image_variants.thumb;
+        img.src = (thumb && thumb.webp) || card.image_path;
+        document.getElementById('edit-current-image-link').href = cardFullImageUrl(card);
         imgWrap.style.display = '';
     } else {
         imgWrap.style.display = 'none';
@@ -1346,6 +1525,9 @@ async function onSaveEditCard(e) {
             card.title = updated.title;
             card.description = updated.description;
             card.image_path = updated.image_path;
+            card.image_width = updated.image_width;
+            card.image_height = updated.image_height;
+            card.image_variants = updated.image_variants;
             card.pin_position = updated.pin_position;
             card.inactive = updated.inactive;
             card.color = updated.color || null;
@@ -1368,7 +1550,7 @@ function updateCardElement(card) {
     content.innerHTML = `
         <div class="card-title">${escHtml(card.title)}</div>
         ${card.description ? `<div class="card-description">${escHtml(card.description)}</div>` : ''}
-        ${card.image_path ? `<img src="${card.image_path}" class="card-image" alt="">` : ''}
+        ${cardImageHtml(card)}
     `;
 }
 
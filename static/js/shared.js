@@ -9,6 +9,11 @@ let panY = 0;
 let zoom = 1;
 
 let cards = [];
+let notes = [];
+let connections = [];
+let boardVersion = 0;
+let refreshing = false;
+let refreshAgain = false;
 
 // ---- Auth header (passive, no board editing) ----
 
@@ -99,18 +104,109 @@ async function handleRegister(e) {
 
 // ---- Board loading ----
 
+// Boards are fetched with one array per field, which is smaller and faster
+// to parse than repeating every key on every row.
+function rowsFromColumns(columns) {
+    const fields = Object.keys(columns);
+    const length = fields.length ? columns[fields[0]].length : 0;
+    const rows = new Array(length);
+    for (let i = 0; i < length; i++) {
+        const row = {};
+        for (const field of fields) row[field] = columns[field][i];
+        rows[i] = row;
+    }
+    return rows;
+}
+
+function boardFromColumns(data) {
+    return {
+        ...data,
+        cards: rowsFromColumns(data.cards),
+        connections: rowsFromColumns(data.connections),
+        notes: rowsFromColumns(data.notes),
+    };
+}
+
 async function initBoard() {
     const token = window.SHARE_TOKEN;
-    const res = await fetch(`/api/share/${token}`);
+    const res = await fetch(`/api/share/${token}?format=columns`);
     if (!res.ok) {
         window.location.href = '/';
         return;
     }
-    const data = await res.json();
+    const data = boardFromColumns(await res.json());
     cards = data.cards;
-    renderCards(data.cards);
-    renderNotes(data.notes || []);
-    renderConnections(data.connections, data.cards);
+    notes = data.notes || [];
+    connections = data.connections;
+    boardVersion = data.board.version;
+    renderBoard();
+    subscribeToChanges();
+}
+
+function renderBoard() {
+    document.querySelectorAll('#canvas .card, #canvas .note').forEach(el => el.remove());
+    renderCards(cards);
+    renderNotes(notes);
+    renderConnections(connections, cards);
+}
+
+// ---- Live updates ----
+
+function subscribeToChanges() {
+    const source = new EventSource(`/api/share/${window.SHARE_TOKEN}/events`);
+    source.addEventListener('version', (e) => {
+        const { version } = JSON.parse(e.data);
+        if (version === null || version > boardVersion) refreshBoard();
+    });
+    source.addEventListener('deleted', () => {
+        source.close();
+        window.location.href = '/';
+    });
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) window.location.href = '/';
+    };
+}
+
+async function refreshBoard() {
+    if (refreshing) {
+        refreshAgain = true;
+        return;
+    }
+    refreshing = true;
+    try {
+        const res = await fetch(`/api/share/${window.SHARE_TOKEN}/changes?since=${boardVersion}&format=columns`);
+        if (res.status === 404) {
+            window.location.href = '/';
+            return;
+        }
+        if (res.status === 409) {
+            window.location.reload();
+            return;
+        }
+        if (!res.ok) return;
+        applyChanges(boardFromColumns(await res.json()));
+    } finally {
+        refreshing = false;
+        if (refreshAgain) {
+            refreshAgain = false;
+            refreshBoard();
+        }
+    }
+}
+
+function mergeById(items, changed, deletedIds) {
+    const deleted = new Set(deletedIds);
+    const byId = new Map(items.filter(item => !deleted.has(item.id)).map(item => [item.id, item]));
+    changed.forEach(item => byId.set(item.id, item));
+    return Array.from(byId.values());
+}
+
+function applyChanges(changes) {
+    cards = mergeById(cards, changes.cards, changes.deleted.cards);
+    notes = mergeById(notes, changes.notes, changes.deleted.notes);
+    connections = mergeById(connections, changes.connections, changes.deleted.connections);
+    boardVersion = Math.max(boardVersion, changes.board.version);
+    renderBoard();
 }
 
 // ---- Rendering ----
@@ -129,6 +225,19 @@ const CARD_COLORS_SHARED = [
     { value: '#2a1e14', bg: '#2a1e14', dark: true  },
 ];
 
+const PIN_POSITIONS = ['left', 'center', 'right'];
+
+// Variants are rendered in the background; until they exist the original is shown.
+function cardImageHtml(card) {
+    if (!card.image_path) return '';
+    const thumb = card.image_variants && card.image_variants.thumb;
+    if (!thumb) return `<img src="${card.image_path}" class="card-image" alt="">`;
+    const display = card.image_variants.display;
+    const full = (display && display.webp) || card.image_path;
+    const avif = thumb.avif ? `<source srcset="${thumb.avif}" type="image/avif">` : '';
+    return `<a href="${full}" target="_blank" rel="noopener"><picture>${avif}<img src="${thumb.webp || card.image_path}" width="${thumb.width}" height="${thumb.height}" class="card-image" loading="lazy" alt=""></picture></a>`;
+}
+
 function renderCards(cardsData) {
     const canvas = document.getElementById('canvas');
     cardsData.forEach(card => {
@@ -137,7 +246,7 @@ function renderCards(cardsData) {
         if (card.inactive) el.classList.add('card-inactive');
         el.style.left = card.pos_x + 'px';
         el.style.top = card.pos_y + 'px';
-        const pinPos = card.pin_position || 'center';
+        const pinPos = PIN_POSITIONS.includes(card.pin_position) ? card.pin_position : 'center';
         const colorEntry = CARD_COLORS_SHARED.find(c => c.value === (card.color || '')) || CARD_COLORS_SHARED[0];
         el.style.background = colorEntry.bg;
         if (colorEntry.dark) el.classList.add('card-dark');
@@ -146,7 +255,7 @@ function renderCards(cardsData) {
             <div class="card-content">
                 <div class="card-title">${escHtml(card.title)}</div>
                 ${card.description ? `<div class="card-description">${escHtml(card.description)}</div>` : ''}
-                ${card.image_path ? `<img src="${card.image_path}" class="card-image" alt="">` : ''}
+                ${cardImageHtml(card)}
             </div>
         `;
         card.el = el;
@@ -0,0 +1,23 @@
+import unittest
+
+from app import BoardGraph
+
+
+class BoardGraphUpdatedTest(unittest.TestCase):
+    def test_resurrected_card_and_connections_survive_their_tombstones(self):
+        graph = BoardGraph.build(4, [1, 2, 3], [(10, 1, 2), (11, 2, 3)])
+        graph = graph.updated(6, [2], [(10, 1, 2), (11, 2, 3)], {2}, {10, 11})
+        self.assertEqual(graph.ids.tolist(), [1, 2, 3])
+        self.assertEqual(sorted(set(graph.edge.tolist())), [10, 11])
+        self.assertEqual(graph.shortest_path(graph.node(1), graph.node(3)), [1, 2, 3])
+
+    def test_deleted_card_drops_its_connections(self):
+        graph = BoardGraph.build(4, [1, 2, 3], [(10, 1, 2), (11, 2, 3)])
+        graph = graph.updated(5, [], [], {2}, {10, 11})
+        self.assertEqual(graph.ids.tolist(), [1, 3])
+        self.assertEqual(graph.edge.tolist(), [])
+        self.assertIsNone(graph.shortest_path(graph.node(1), graph.node(3)))
+
+
+if __name__ == "__main__":
+    unittest.main()